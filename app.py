@@ -1,23 +1,58 @@
-from flask import Flask, jsonify
-from flask_cors import CORS
-from config.mongodbConfig import MongoDBConfig
-from routes.routes import routes  # Import the routes from the routes module
-import sys
-import os
-import pandas as pd
-import pickle
+from utils.startup import BACKGROUND_THREADS_AT_IMPORT, startup  # first, so the startup clock covers every import
+with startup.phase("imports"):
+    from flask import Flask, jsonify
+    from flask_cors import CORS
+    from config.mongodbConfig import get_client, warmup
+    from routes.routes import routes  # Import the routes from the routes module
+    from utils import metrics
+    from utils.logger import logger
+    import sys
+    import os
 
 # Flask app initialization
 app = Flask(__name__)
 CORS(app)
 
-# MongoDB configuration
-mongo_config = MongoDBConfig()
-client = mongo_config.get_client()
-
 # Register the routes
 app.register_blueprint(routes)
 
+# Per-route request timing for /metrics
+metrics.init_app(app)
+
+client = None
+
+
+def start():
+    """Connect to MongoDB and load the model and controllers before the port opens."""
+    global client
+    # MongoDB configuration: one pooled client per process, connections opened up front
+    # (under gunicorn each worker warms its own client in post_fork; the master's is discarded)
+    with startup.phase("db_connect"):
+        client = get_client()
+        if os.environ.get("MONGO_WARMUP", "1") != "0" and BACKGROUND_THREADS_AT_IMPORT:
+            warmup()
+
+    # Load the model and controllers up front, so the first request doesn't pay for it
+    if os.environ.get("STARTUP_PRELOAD", "1") != "0":
+        with startup.phase("model_load"):
+            import controller.predictioncontroller as predictioncontroller
+        with startup.phase("controllers"):
+            import controller.reccomdationcontroller  # noqa: F401
+            import controller.predictrecommendcontroller  # noqa: F401
+        # A fresh deploy has no model yet; serve anyway so /train_stress_level can publish the first one
+        if predictioncontroller.model_holder.current() is not None:
+            with startup.phase("warmup"):
+                predictioncontroller.warmup()
+        else:
+            logger.warn("No trained model yet; skipping prediction warmup")
+    startup.finish()
+
+
+# Training workers are spawned processes that re-import this module as __mp_main__ under
+# `python app.py`; they must not connect, preload the model or start the background threads
+if __name__ != "__mp_main__":
+    start()
+
 # Global variables
 stress_level_model = None
 data = None
@@ -25,30 +60,33 @@ data = None
 # Function to load sample data
 def load_sample_data():
     global data
+    # pandas is only needed here, so it stays off the serving import path
+    import pandas as pd
+    from utils.data_loader import FEATURE_COLUMNS, TARGET_COLUMN
+    from utils.training_snapshot import load_training_data
     try:
         # Attempt to connect to MongoDB
         db = client.data_set
         collection = db.stress_data_set
-        documents = collection.find()
-        data = pd.DataFrame(list(documents))
-        data.drop(columns=['_id'], inplace=True, errors='ignore')
+        X, y, _ = load_training_data(collection)
+        data = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+        data[TARGET_COLUMN] = y
         
         # Check if the first row is loaded correctly
         if not data.empty:
-            print("First row of the dataset:")
-            print(data.iloc[0])  # Print the first row
-            print("Success: Data loaded correctly")
+            logger.debug("First row of the dataset: %s", data.iloc[0].to_dict())
+            logger.info("Success: Data loaded correctly")
         else:
             raise ValueError("No data found in the MongoDB collection.")
     
     except errors.ConnectionError as e:
         # Handle the case where MongoDB is not connected
-        print(f"Error: MongoDB connection failed. {e}")
+        logger.error("Error: MongoDB connection failed. %s", e)
         sys.exit(1)  # Terminate the app
 
     except Exception as e:
         # Handle other potential errors
-        print(f"Error: {e}")
+        logger.error("Error: %s", e)
         sys.exit(1)  # Terminate the app
 
 
@@ -56,6 +94,7 @@ def load_sample_data():
 # Function to load trained models
 def load_models():
     global stress_level_model
+    import pickle
     model_path = 'models/random_forest.pkl'
 
     # Check if the model file exists
@@ -66,13 +105,13 @@ def load_models():
                 # Load the model from the pickle file
                 with open(model_path, 'rb') as f:
                     stress_level_model = pickle.load(f)
-                print("Model loaded successfully.")
+                logger.info("Model loaded successfully.")
             except EOFError:
-                print("Model file is empty. Retraining model...")
+                logger.warn("Model file is empty. Retraining model...")
         else:
-            print("Model file is empty. Retraining model...")
+            logger.warn("Model file is empty. Retraining model...")
     else:
-        print("Model file not found. Retraining model...")
+        logger.warn("Model file not found. Retraining model...")
         
         
 @app.route('/')
@@ -82,10 +121,23 @@ def index():
         "message": "Stress Detection Flask Application",
         "endpoints": {
             "/predict_stress_level": "Predict stress level using input features",
+            "/predict_stress_level/batch": "Predict stress levels for a list of readings in one call (JSON, application/x-npy or application/x-stress-matrix)",
+            "/predict_stress_level/batch_stats": "Batch sizes and queue wait of coalesced single predictions",
             "/recommendation": "Get recommendations based on similar inputs",
-            "/train_stress_level": "Retrain Random Forest model for stress level",
+            "/predict_and_recommend": "Predict stress level and get recommendations for one reading in a single call",
+            "/recommendation/cold/batch": "Cold-start recommendations for a list of readings",
+            "/recommendation/profiles/backfill": "Rebuild every user's materialized recommendation profile",
+            "/train_stress_level": "Start a background job retraining the Random Forest model for stress level",
+            "/train_stress_level/incremental": "Start a background job growing the model with trees fitted on new data",
+            "/train_stress_level/select": "Start a background job picking the smallest, fastest model within the accuracy tolerance",
+            "/jobs/<job_id>": "Status, phase timings and result of a training job",
+            "/model/version": "Active model version and its load time",
+            "/startup": "Per-phase timing of this process's startup",
+            "/metrics": "Request and stage latency histograms in Prometheus format",
             # "/train_content_based": "Retrain Content-Based model"
-            "/adddata":"add the previous data to the original database"
+            "/adddata":"add the previous data to the original database",
+            "/addData/status": "Progress and throughput of the last data migration",
+            "/db/pool_stats": "MongoDB connection pool usage and checkout wait times"
         }
     })
 
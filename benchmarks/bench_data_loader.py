@@ -0,0 +1,81 @@
+"""
+Benchmark of the streaming training loader against the original DataFrame path.
+
+Seeds a scratch collection with data/stress_data_set.csv repeated up to --rows
+documents, then loads it with:
+  legacy    pd.DataFrame(list(collection.find())) as train_stress_level used to
+  streaming utils.data_loader.load_training_arrays
+and reports wall time and peak Python heap (tracemalloc) for each.
+
+Needs a MongoDB you can write to (the scratch database is dropped afterwards):
+    BENCH_MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_data_loader --rows 2000000
+"""
+
+import argparse
+import csv
+import gc
+import os
+import time
+import tracemalloc
+import pandas as pd
+from pymongo import MongoClient
+from utils.data_loader import TARGET_COLUMN, load_training_arrays
+
+
+def seed(collection, csv_path, rows):
+    with open(csv_path) as f:
+        template = [{k: float(v) for k, v in row.items()} for row in csv.DictReader(f)]
+    collection.drop()
+    inserted = 0
+    while inserted < rows:
+        chunk = template[:rows - inserted]
+        # insert_many adds _id to the dicts, so hand it fresh copies
+        collection.insert_many([dict(row) for row in chunk], ordered=False)
+        inserted += len(chunk)
+    return inserted
+
+
+def legacy_load(collection):
+    data = pd.DataFrame(list(collection.find()))
+    data.drop(columns=['_id'], inplace=True, errors='ignore')
+    return data.drop(columns=[TARGET_COLUMN]), data[TARGET_COLUMN]
+
+
+def streaming_load(collection, batch_size):
+    X, y, _ = load_training_arrays(collection, batch_size=batch_size)
+    return X, y
+
+
+def measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    X, y = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows": len(y), "seconds": round(elapsed, 3), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.environ.get("BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--csv", default="data/stress_data_set.csv")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    collection = client.bench_data_set.stress_data_set
+    try:
+        print(f"seeded {seed(collection, args.csv, args.rows)} documents")
+        print(f"legacy    : {measure(lambda: legacy_load(collection))}")
+        print(f"streaming : {measure(lambda: streaming_load(collection, args.batch_size))}")
+    finally:
+        if not args.keep:
+            client.drop_database("bench_data_set")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+End-to-end benchmark of the HTTP endpoints against an in-process MongoDB stand-in.
+
+Installs a mongomock client with config.mongodbConfig.set_client, seeds it with
+data/stress_data_set.csv (repeated up to --rows) and synthetic user histories,
+trains a first model, then drives the app through the Flask test client:
+
+  predict              POST /predict_stress_level, one reading per request
+  predict_batch        POST /predict_stress_level/batch with --batch-size readings
+  recommendation       POST /recommendation for warm users, new readings each time
+  recommendation_hit   the same request repeated (served by the result cache)
+  recommendation_cold  POST /recommendation for users below the history threshold
+  predict_and_recommend  POST /predict_and_recommend for warm users, a reading plus user_id per request
+  add_data             POST /addData with --temp-rows pending documents, until done
+                       (units are the documents each run reports moved, queued predictions included)
+  train                GET /train_stress_level, until the job finishes
+
+For each scenario it records throughput, p50/p95/p99/max latency, errors and
+peak memory (Python heap via tracemalloc with --tracemalloc, process RSS
+always), and writes everything as JSON so runs can be diffed with
+benchmarks/compare.py. Needs no network or MongoDB server:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_endpoints --output bench.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+FEATURES = ["snoring_range", "respiration_rate", "body_temperature", "limb_movement", "blood_oxygen",
+            "heart_rate", "sleep_duration", "age", "weight"]
+
+
+def configure_environment(workdir):
+    # Everything must be set before the app modules read their settings at import
+    os.environ.setdefault("MODEL_DIR", os.path.join(workdir, "models"))
+    os.environ.setdefault("TRAINING_SNAPSHOT_DIR", os.path.join(workdir, "snapshot"))
+    os.environ["TRAINING_EXECUTOR"] = "thread"  # a process pool wouldn't see the in-process stand-in
+    os.environ["RECOMMENDATION_CACHE_LISTENER"] = "0"  # mongomock has no change streams
+    os.environ.setdefault("PROFILE_MAX_AGE_SECONDS", str(24 * 3600))
+    os.environ.setdefault("MODEL_POLL_INTERVAL_SECONDS", "0")
+    os.environ.setdefault("MONGO_WARMUP", "0")
+
+
+def load_csv(path):
+    with open(path) as f:
+        return [{key: float(value) for key, value in row.items()} for row in csv.DictReader(f)]
+
+
+def seed_dataset(db, template, rows):
+    collection = db.data_set.stress_data_set
+    collection.drop()
+    inserted = 0
+    while inserted < rows:
+        chunk = template[:rows - inserted]
+        collection.insert_many([dict(row) for row in chunk])
+        inserted += len(chunk)
+
+
+def seed_temp(db, template, rows):
+    db.data_set.stress_data_set_temp.insert_many([dict(template[i % len(template)]) for i in range(rows)])
+
+
+def seed_users(db, parameters, users, history, cold_users, rng):
+    from bson import ObjectId
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    warm_ids, cold_ids = [], []
+    for index in range(users + cold_users):
+        user_id = ObjectId()
+        entries = history if index < users else 10
+        db.test.userparameters.insert_one({"userId": user_id, "parameters": [
+            dict({p: rng.random() for p in parameters}, recordedAt=start + timedelta(minutes=i)) for i in range(entries)
+        ]})
+        db.test.userrecommendations.insert_one({"userId": user_id, "recommendations": [
+            dict({p: rng.random() for p in parameters}, recommendationDate=start + timedelta(minutes=i),
+                 recommendationText=[f"advice {i}"]) for i in range(entries)
+        ]})
+        (warm_ids if index < users else cold_ids).append(str(user_id))
+    return warm_ids, cold_ids
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def rss_mb():
+    # ru_maxrss is the high-water mark, in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_requests(app, name, make_request, requests, concurrency, warmup, trace):
+    """Issue requests (split across concurrency threads) and summarize their latency."""
+    client = app.test_client()
+    for i in range(warmup):
+        make_request(client, i)
+
+    def worker(offset):
+        local_client = app.test_client()
+        latencies, errors = [], 0
+        for i in range(offset, requests, concurrency):
+            started = time.perf_counter()
+            response = make_request(local_client, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+        return latencies, errors
+
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    heap_peak = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": sum(result[1] for result in results),
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {"p50": round(percentile(latencies, 0.5), 3), "p95": round(percentile(latencies, 0.95), 3),
+                       "p99": round(percentile(latencies, 0.99), 3), "max": round(latencies[-1], 3)},
+        "heap_peak_mb": round(heap_peak / 2 ** 20, 2) if heap_peak is not None else None,
+        "rss_peak_mb": round(rss_mb(), 1),
+    }
+
+
+def run_until_done(app, name, start, poll, repeat, units, trace):
+    """
+    Time a background operation from its start request until poll() reports it finished.
+    units is the work done per run, or a callable returning the total over all runs
+    when only the operation itself knows how much it did.
+    """
+    client = app.test_client()
+    timings, errors = [], 0
+    if trace:
+        tracemalloc.start()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = start(client)
+        errors += response.status_code >= 400
+        while response.status_code < 400 and not poll(client, response.get_json()):
+            time.sleep(0.01)
+        timings.append(time.perf_counter() - started)
+    heap_peak = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+    total_units = units() if callable(units) else units * repeat
+    return {
+        "scenario": name,
+        "requests": repeat,
+        "errors": errors,
+        "seconds": round(total, 4),
+        "units": round(total_units / repeat, 1),
+        "throughput_units_per_second": round(total_units / total, 2) if total else None,
+        "latency_ms": {"p50": round(percentile(timings, 0.5) * 1000, 3), "p95": round(percentile(timings, 0.95) * 1000, 3),
+                       "p99": round(percentile(timings, 0.99) * 1000, 3), "max": round(timings[-1] * 1000, 3)},
+        "heap_peak_mb": round(heap_peak / 2 ** 20, 2) if heap_peak is not None else None,
+        "rss_peak_mb": round(rss_mb(), 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="data/stress_data_set.csv")
+    parser.add_argument("--rows", type=int, default=10000, help="training documents to seed")
+    parser.add_argument("--users", type=int, default=20, help="warm users with synthetic histories")
+    parser.add_argument("--cold-users", type=int, default=20)
+    parser.add_argument("--history", type=int, default=500, help="parameter and recommendation entries per warm user")
+    parser.add_argument("--requests", type=int, default=500, help="requests per request/response scenario")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=100, help="readings per /predict_stress_level/batch call")
+    parser.add_argument("--temp-rows", type=int, default=5000, help="pending documents moved by each /addData run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of the /addData and training scenarios")
+    parser.add_argument("--scenarios", default="all", help="comma separated subset of the scenarios above")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record peak Python heap (slows requests)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("mongomock is required: pip install -r benchmarks/requirements.txt")
+    import random
+
+    workdir = tempfile.mkdtemp(prefix="bench-endpoints-")
+    configure_environment(workdir)
+
+    from config.mongodbConfig import set_client
+    mongo = mongomock.MongoClient()
+    set_client(mongo)
+
+    rng = random.Random(args.seed)
+    template = load_csv(args.csv)
+    seed_dataset(mongo, template, args.rows)
+
+    # The app loads the active model at import, so publish a first version before importing it
+    from controller.trainingcontroller import fit_full_model
+    fit_full_model()
+
+    from app import app
+    from controller.reccomdationcontroller import INPUT_FEATURES_IMPACT, profile_syncer
+    warm_ids, cold_ids = seed_users(mongo, list(INPUT_FEATURES_IMPACT), args.users, args.history,
+                                    args.cold_users, rng)
+    for user_id in warm_ids + cold_ids:
+        profile_syncer.rebuild(user_id)
+
+    readings = [{key: row[key] for key in FEATURES} for row in template]
+
+    def reading(i):
+        return readings[i % len(readings)]
+
+    def recommendation_payload(user_id):
+        return dict({p: rng.random() for p in INPUT_FEATURES_IMPACT}, user_id=user_id)
+
+    hit_payload = dict({p: 0.5 for p in INPUT_FEATURES_IMPACT}, user_id=warm_ids[0] if warm_ids else None)
+
+    previous_run = {"moved": []}
+
+    def start_add_data(client):
+        seed_temp(mongo, template, args.temp_rows)
+        previous_run["started_at"] = client.get("/addData/status").get_json().get("started_at")
+        return client.post("/addData")
+
+    def add_data_done(client, _):
+        # The status still describes the previous run until the new one records its start
+        status = client.get("/addData/status").get_json()
+        done = (status.get("started_at") != previous_run["started_at"]
+                and status.get("status") in ("completed", "failed"))
+        if done:
+            # Predictions queued by earlier scenarios are moved too, so count what the run reports
+            previous_run["moved"].append(status.get("moved") or 0)
+        return done
+
+    def train_done(client, submitted):
+        return client.get(submitted["status_url"]).get_json().get("status") not in ("queued", "running")
+
+    request_scenarios = {
+        "predict": lambda c, i: c.post("/predict_stress_level", json=dict(reading(i))),
+        "predict_batch": lambda c, i: c.post("/predict_stress_level/batch", json={
+            "readings": [reading(i * args.batch_size + j) for j in range(args.batch_size)]}),
+        "recommendation": lambda c, i: c.post("/recommendation", json=recommendation_payload(
+            warm_ids[i % len(warm_ids)])),
+        "recommendation_hit": lambda c, i: c.post("/recommendation", json=hit_payload),
+        "recommendation_cold": lambda c, i: c.post("/recommendation", json=recommendation_payload(
+            cold_ids[i % len(cold_ids)])),
+        "predict_and_recommend": lambda c, i: c.post("/predict_and_recommend", json=dict(
+            reading(i), user_id=warm_ids[i % len(warm_ids)])),
+    }
+    job_scenarios = {
+        "add_data": (start_add_data, add_data_done, lambda: sum(previous_run["moved"])),
+        "train": (lambda c: c.get("/train_stress_level"), train_done, args.rows),
+    }
+    selected = list(request_scenarios) + list(job_scenarios) if args.scenarios == "all" else args.scenarios.split(",")
+    if not warm_ids:
+        selected = [s for s in selected if s not in ("recommendation", "recommendation_hit", "predict_and_recommend")]
+    if not cold_ids and "recommendation_cold" in selected:
+        selected.remove("recommendation_cold")
+
+    results = []
+    for name in selected:
+        if name in request_scenarios:
+            result = run_requests(app, name, request_scenarios[name], args.requests, args.concurrency,
+                                  args.warmup, args.tracemalloc)
+        elif name in job_scenarios:
+            start, poll, units = job_scenarios[name]
+            result = run_until_done(app, name, start, poll, args.repeat, units, args.tracemalloc)
+        else:
+            sys.exit(f"Unknown scenario: {name}")
+        print(f"{name:<20} {result['latency_ms']}", file=sys.stderr)
+        results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
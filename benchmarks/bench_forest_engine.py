@@ -0,0 +1,84 @@
+"""
+Parity check and microbenchmark for utils/forest_engine.py.
+
+Trains the same forest as train_stress_level on data/stress_data_set.csv, checks that
+FlatForest.predict matches RandomForestClassifier.predict on every row (plus random,
+jittered and on-threshold rows), then times single-row and batch prediction.
+
+Run from the repository root:
+    python -m benchmarks.bench_forest_engine
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from utils.forest_engine import FlatForest
+
+FEATURES = [
+    'snoring_range', 'respiration_rate', 'body_temperature',
+    'limb_movement', 'blood_oxygen', 'heart_rate',
+    'sleep_duration', 'age', 'weight'
+]
+
+
+def time_calls(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="data/stress_data_set.csv")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.csv)
+    X = data[FEATURES].to_numpy(dtype=np.float64)
+    y = data['stress_level'].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X_train, y_train)
+    engine = FlatForest.from_sklearn(model)
+
+    # Parity: dataset rows, points scattered around them, and points right on split thresholds
+    rng = np.random.default_rng(0)
+    low, high = X.min(axis=0), X.max(axis=0)
+    random_rows = rng.uniform(low, high, size=(20000, X.shape[1]))
+    jittered = X + rng.normal(scale=0.01, size=X.shape) * (high - low)
+    on_threshold = X[:len(engine.threshold)].copy()
+    split_nodes = engine.left != np.arange(len(engine.left))
+    thresholds = engine.threshold[split_nodes][:len(on_threshold)]
+    on_threshold[np.arange(len(thresholds)), engine.feature[split_nodes][:len(thresholds)]] = thresholds
+
+    for name, rows in [("dataset", X), ("random", random_rows), ("jittered", jittered), ("thresholds", on_threshold)]:
+        expected = model.predict(rows)
+        actual = engine.predict(rows)
+        mismatches = int((expected != actual).sum())
+        print(f"parity[{name}]: {len(rows)} rows, {mismatches} mismatches")
+        assert mismatches == 0, f"FlatForest disagrees with sklearn on {mismatches} {name} rows"
+
+    row = X_test[0].tolist()
+    print(f"single row, sklearn : {time_calls(lambda: model.predict([row]), args.repeat)}")
+    print(f"single row, engine  : {time_calls(lambda: engine.predict_one(row), args.repeat)}")
+
+    batch = random_rows[:args.batch_size]
+    repeat = max(1, args.repeat // 20)
+    print(f"{len(batch)} rows, sklearn : {time_calls(lambda: model.predict(batch), repeat)}")
+    print(f"{len(batch)} rows, engine  : {time_calls(lambda: engine.predict(batch), repeat)}")
+
+
+if __name__ == "__main__":
+    main()
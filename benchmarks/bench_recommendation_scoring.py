@@ -0,0 +1,90 @@
+"""
+Benchmark of content-based recommendation scoring.
+
+Compares the original pandas implementation (DataFrame conversion, sort_values,
+row-wise apply, full sort, idxmax) with the vectorized scoring in
+utils/recommendation_scoring.py on synthetic histories of 10 to 100k rows, and
+checks that both pick a recommendation with the same best score.
+
+Run from the repository root:
+    python -m benchmarks.bench_recommendation_scoring
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from utils.recommendation_scoring import build_parameter_matrix, latest_entry, score_rows, top_k_indices
+
+PARAMETER_IMPACT = {"limb_movement": 0.29742103, "snoring_range": 0.25524384, "sleep_duration": 0.17544529,
+                    "blood_oxygen": 0.16807567, "respiration_rate": 0.03291568, "heart_rate": 0.0273243,
+                    "age": 0.01532486, "body_temperature": 0.01414235, "weight": 0.01410698}
+
+
+def synthetic_history(rows, rng):
+    start = datetime(2024, 1, 1)
+    parameters = [dict({p: float(rng.random()) for p in PARAMETER_IMPACT}, recordedAt=start + timedelta(minutes=i))
+                  for i in range(rows)]
+    recommendations = [dict({p: float(rng.random()) for p in PARAMETER_IMPACT},
+                            recommendationDate=start + timedelta(minutes=i),
+                            recommendationText=[f"advice {i}"])
+                       for i in range(rows)]
+    return parameters, recommendations
+
+
+def legacy_best(current, parameters, recommendations):
+    params = pd.DataFrame(parameters).sort_values(by="recordedAt", ascending=False)
+    recent = params.iloc[0]
+    combined = {p: (current.get(p, 0) + recent.get(p, 0)) / 2 for p in PARAMETER_IMPACT}
+    recs = pd.DataFrame(recommendations).sort_values(by="recommendationDate", ascending=False).copy()
+
+    def compute_similarity(row):
+        return sum(w * (1 - abs(row.get(p, 0) - combined.get(p, 0))) for p, w in PARAMETER_IMPACT.items())
+
+    recs['Similarity'] = recs.apply(compute_similarity, axis=1)
+    recs = recs.sort_values(by="Similarity", ascending=False)
+    best = recs['Similarity'].idxmax()
+    return recs.loc[best, 'Similarity']
+
+
+def vectorized_best(current, parameters, recommendations, k):
+    names = list(PARAMETER_IMPACT)
+    weights = np.array([PARAMETER_IMPACT[p] for p in names])
+    recent = latest_entry(parameters, "recordedAt")
+    target = np.array([(current.get(p, 0) + recent.get(p, 0)) / 2 for p in names])
+    scores = score_rows(build_parameter_matrix(recommendations, names), target, weights)
+    dates = [rec.get("recommendationDate") for rec in recommendations]
+    best = top_k_indices(scores, k, dates)
+    return scores[best[0]]
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    current = {p: float(rng.random()) for p in PARAMETER_IMPACT}
+    print(f"{'rows':>8} {'legacy ms':>12} {'vectorized ms':>14} {'speedup':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        parameters, recommendations = synthetic_history(size, rng)
+        legacy_score, legacy_ms = timed(lambda: legacy_best(current, parameters, recommendations), args.repeat)
+        new_score, new_ms = timed(lambda: vectorized_best(current, parameters, recommendations, args.top_k), args.repeat)
+        assert np.isclose(legacy_score, new_score), f"best score differs at {size} rows"
+        print(f"{size:>8} {legacy_ms:>12.2f} {new_ms:>14.2f} {legacy_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
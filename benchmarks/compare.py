@@ -0,0 +1,70 @@
+"""
+Compare two benchmark result files written by benchmarks.bench_endpoints.
+
+Prints p50/p95/p99 latency and throughput per scenario with the relative change,
+and exits with status 1 if any scenario's p95 latency grew by more than
+--threshold (default 10%), so it can gate a CI job:
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {scenario["scenario"]: scenario for scenario in report["scenarios"]}
+
+
+def throughput(scenario):
+    return scenario.get("throughput_rps") or scenario.get("throughput_units_per_second")
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old
+
+
+def format_change(value):
+    return "n/a" if value is None else f"{value:+.1%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative p95 latency increase")
+    args = parser.parse_args()
+
+    baseline_report, baseline = load(args.baseline)
+    candidate_report, candidate = load(args.candidate)
+    print(f"baseline {baseline_report.get('commit')}  ->  candidate {candidate_report.get('commit')}")
+    print(f"{'scenario':<20} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18} {'throughput':>20}")
+
+    regressions = []
+    for name in baseline:
+        if name not in candidate:
+            print(f"{name:<20} missing from candidate")
+            continue
+        old, new = baseline[name], candidate[name]
+        cells = []
+        for q in ("p50", "p95", "p99"):
+            delta = change(old["latency_ms"][q], new["latency_ms"][q])
+            cells.append(f"{new['latency_ms'][q]:>9.2f} {format_change(delta):>8}")
+            if q == "p95" and delta is not None and delta > args.threshold:
+                regressions.append(name)
+        delta = change(throughput(old), throughput(new))
+        cells.append(f"{throughput(new) or 0:>11.1f} {format_change(delta):>8}")
+        print(f"{name:<20} " + " ".join(cells))
+
+    if regressions:
+        print(f"p95 latency regressed by more than {args.threshold:.0%} in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
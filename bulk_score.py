@@ -0,0 +1,143 @@
+"""
+Re-score an archive of readings offline with the active stress level model.
+
+Streams the input CSV in fixed-size chunks, scores the chunks on a process pool
+(the model is loaded once per worker) and appends them to the output CSV in input
+order, with a predicted_stress_level column added. At most a few chunks per worker
+are in flight, so memory stays flat however large the input is.
+
+Rows with a value that is infinite or too large for float32 get an empty prediction;
+missing or non-numeric values are scored as missing, like the model does.
+
+    python bulk_score.py data/stress_data_set.csv scored.csv
+    python bulk_score.py readings.csv scored.csv --workers 8 --chunk-size 100000
+    python bulk_score.py readings.csv scored.csv --model models/random_forest.pkl
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.data_loader import FEATURE_COLUMNS
+from utils.logger import logger
+
+PREDICTION_COLUMN = "predicted_stress_level"
+
+# The model of a pool worker (or of this process with --workers 0)
+_engine = None
+
+
+def _load_engine(version, model_path):
+    from utils.forest_engine import FlatForest
+    if model_path:
+        import joblib
+        return FlatForest.from_sklearn(joblib.load(model_path))
+    from utils.model_registry import registry
+    engine, _, _ = registry.load_engine(version, mmap_mode="r")
+    return engine
+
+
+def _init_worker(version, model_path):
+    global _engine
+    _engine = _load_engine(version, model_path)
+
+
+def score_chunk(features):
+    """Predictions for a (rows, features) array; -1 for rows the model can't take."""
+    features = np.asarray(features, dtype=np.float32)
+    rejected = np.isinf(features).any(axis=1)
+    predictions = np.full(len(features), -1, dtype=np.int64)
+    if rejected.any():
+        valid = ~rejected
+        if valid.any():
+            predictions[valid] = _engine.predict(features[valid])
+    elif len(features):
+        predictions[:] = _engine.predict(features)
+    return predictions
+
+
+def _features(chunk):
+    return chunk[FEATURE_COLUMNS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _write(chunk, predictions, output, header):
+    # Nullable integers, so rejected rows are written as empty cells
+    chunk[PREDICTION_COLUMN] = pd.arrays.IntegerArray(predictions, predictions < 0)
+    chunk.to_csv(output, index=False, header=header)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV with the model's feature columns")
+    parser.add_argument("output", help="CSV to write; the input columns plus predicted_stress_level")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="0 scores in this process")
+    parser.add_argument("--model", help="a pickled sklearn model to use instead of the active registry version")
+    parser.add_argument("--version", help="registry version to use instead of the active one")
+    args = parser.parse_args()
+
+    # Pin the version now so every worker scores with the same model even if a new one is published
+    version = args.version
+    if not args.model and version is None:
+        from utils.model_registry import registry
+        version = registry.current_version()
+        if version is None:
+            sys.exit("No trained model found; train one first or pass --model")
+
+    reader = pd.read_csv(args.input, chunksize=args.chunk_size)
+    started = time.perf_counter()
+    rows = 0
+    chunks = 0
+    with open(args.output, "w", newline="") as output:
+        def write(chunk, predictions):
+            nonlocal rows, chunks
+            _write(chunk, predictions, output, header=chunks == 0)
+            rows += len(chunk)
+            chunks += 1
+            elapsed = time.perf_counter() - started
+            logger.info("Scored %s rows (%.0f rows/sec)", rows, rows / elapsed if elapsed else 0.0)
+
+        first = True
+        if args.workers <= 0:
+            _init_worker(version, args.model)
+            for chunk in reader:
+                if first:
+                    _check_columns(chunk)
+                    first = False
+                write(chunk, score_chunk(_features(chunk)))
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(version, args.model)) as executor:
+                # Bounded window of chunks in flight; results are written in submission order
+                pending = deque()
+                for chunk in reader:
+                    if first:
+                        _check_columns(chunk)
+                        first = False
+                    pending.append((chunk, executor.submit(score_chunk, _features(chunk))))
+                    if len(pending) >= 2 * args.workers:
+                        done_chunk, future = pending.popleft()
+                        write(done_chunk, future.result())
+                while pending:
+                    done_chunk, future = pending.popleft()
+                    write(done_chunk, future.result())
+
+    elapsed = time.perf_counter() - started
+    print(f"scored {rows} rows in {chunks} chunks in {elapsed:.2f}s "
+          f"({rows / elapsed if elapsed else 0:.0f} rows/sec) with model {args.model or version}")
+
+
+def _check_columns(chunk):
+    missing = [column for column in FEATURE_COLUMNS if column not in chunk.columns]
+    if missing:
+        sys.exit(f"Input is missing feature columns: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,205 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import time
 from dotenv import load_dotenv
+from utils.logger import logger
 
 # Load environment variables
 load_dotenv()
 
+
+def _int_env(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Connection pool settings
+MAX_POOL_SIZE = _int_env("MONGO_MAX_POOL_SIZE", 100)
+MIN_POOL_SIZE = _int_env("MONGO_MIN_POOL_SIZE", 2)
+WAIT_QUEUE_TIMEOUT_MS = _int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS")  # None waits for a free connection indefinitely
+MAX_IDLE_TIME_MS = _int_env("MONGO_MAX_IDLE_TIME_MS")
+SERVER_SELECTION_TIMEOUT_MS = _int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000)
+COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"; zstd and snappy need extra packages
+WARMUP_CONNECTIONS = _int_env("MONGO_WARMUP_CONNECTIONS", MIN_POOL_SIZE)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts pool events and measures how long each connection checkout waited."""
+
+    def __init__(self, window=1000):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._waits_ms = deque(maxlen=window)
+        self.open = 0
+        self.in_use = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.max_wait_ms = 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        # Started and finished events for one checkout fire on the same thread
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        wait_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self._waits_ms.append(wait_ms)
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            percentile = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else None
+            return {
+                "open_connections": self.open,
+                "in_use": self.in_use,
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "checkout_wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+                                     "max": round(self.max_wait_ms, 3)},
+            }
+
+
 class MongoDBConfig:
     def __init__(self):
         self.mongo_uri = os.getenv("MONGO_URI")  # Read MongoDB URI from environment
         self.client = None
+        self.listener = PoolStatsListener()
+
+    def client_options(self):
+        options = {
+            "maxPoolSize": MAX_POOL_SIZE,
+            "minPoolSize": MIN_POOL_SIZE,
+            "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+            "event_listeners": [self.listener],
+        }
+        if WAIT_QUEUE_TIMEOUT_MS is not None:
+            options["waitQueueTimeoutMS"] = WAIT_QUEUE_TIMEOUT_MS
+        if MAX_IDLE_TIME_MS is not None:
+            options["maxIdleTimeMS"] = MAX_IDLE_TIME_MS
+        if COMPRESSORS:
+            options["compressors"] = COMPRESSORS
+        return options
 
     def connect(self):
         try:
-            self.client = MongoClient(self.mongo_uri)  # Connect without specifying a DB
-            print("Connected to MongoDB successfully!")
+            self.client = MongoClient(self.mongo_uri, **self.client_options())  # Connect without specifying a DB
+            logger.info("Connected to MongoDB successfully!")
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
+            logger.error("Error connecting to MongoDB: %s", e)
 
     def get_client(self):
         if self.client is None:
             self.connect()
         return self.client  # Return the MongoDB client
 
+    def warmup(self, connections=WARMUP_CONNECTIONS):
+        """Open connections up front with concurrent pings so the first requests don't pay for handshakes."""
+        client = self.get_client()
+        started = time.perf_counter()
+        connections = max(1, connections or 1)
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(lambda _: client.admin.command("ping"), range(connections)))
+        logger.info("Warmed up %s MongoDB connections in %.3fs", connections, time.perf_counter() - started)
+
+
+# One shared client per process; MongoClient isn't fork-safe, so a forked child makes its own
+_shared_config = None
+_shared_pid = None
+_shared_lock = threading.Lock()
+# A client installed with set_client() replaces the pooled one (benchmarks, local stand-ins)
+_override_client = None
+
+
+def set_client(client):
+    """Serve every get_client() call from client, e.g. a mongomock client; None goes back to MONGO_URI."""
+    global _override_client
+    _override_client = client
+
+
+def _shared():
+    global _shared_config, _shared_pid
+    if _shared_config is None or _shared_pid != os.getpid():
+        with _shared_lock:
+            if _shared_config is None or _shared_pid != os.getpid():
+                config = MongoDBConfig()
+                config.get_client()
+                _shared_config, _shared_pid = config, os.getpid()
+    return _shared_config
+
+
+def get_client():
+    """The process-wide pooled MongoClient."""
+    if _override_client is not None:
+        return _override_client
+    return _shared().get_client()
+
+
+def warmup(connections=WARMUP_CONNECTIONS):
+    """Pre-open pooled connections; failures are logged, not raised, so startup doesn't depend on the database."""
+    if _override_client is not None:
+        return
+    try:
+        _shared().warmup(connections)
+    except Exception as e:
+        logger.warn("MongoDB warmup failed: %s", e)
+
+
+def pool_stats():
+    """Pool settings and usage counters of this process's client."""
+    if _override_client is not None:
+        return {"pid": os.getpid(), "client": type(_override_client).__name__}
+    config = _shared()
+    return dict(config.listener.stats(), pid=os.getpid(), max_pool_size=MAX_POOL_SIZE, min_pool_size=MIN_POOL_SIZE,
+                wait_queue_timeout_ms=WAIT_QUEUE_TIMEOUT_MS, compressors=COMPRESSORS or None)
+
 # Usage Example
 if __name__ == "__main__":
-    mongo_config = MongoDBConfig()
-    mongo_config.connect()
-    client = mongo_config.get_client()
-    print("Databases:", client.list_database_names())  # List all available databases
+    client = get_client()
+    logger.info("Databases: %s", client.list_database_names())  # List all available databases
@@ -1,40 +1,64 @@
+import threading
 from flask import jsonify
-from app import client  # Use the existing MongoDB client
+from config.mongodbConfig import get_client  # Shared pooled MongoDB client
 from utils.logger import logger
-from config.mongodbConfig import MongoDBConfig
+from utils.data_migration import MigrationLocked, TempToMainMigration
+
+
+def _migration():
+    return TempToMainMigration(get_client().data_set)
+
+
+def _run_migration(migration):
+    try:
+        state = migration.run()
+        logger.info("--------------------Data successfully added into db: %s documents--------------------", state.get('moved'))
+    except Exception as e:
+        logger.error("Some error occured while adding data into db: %s", e)
+    finally:
+        migration.release()
+
+
+def _status_body(state):
+    if state is None:
+        return {"status": "never_run"}
+    body = {key: value for key, value in state.items() if key not in ("_id", "owner")}
+    for key in ("watermark", "last_id"):
+        if body.get(key) is not None:
+            body[key] = str(body[key])
+    total = body.get("total") or 0
+    body["progress"] = body.get("moved", 0) / total if total else 1.0
+    return body
+
 
 def adddata():
-    """Move dataset from temporary collection to the main collection and delete the temporary collection"""
+    """
+    Move the temp collection's documents into the main collection in the background.
+
+    Only documents present when the run starts are moved, chunk by chunk, and an interrupted
+    run resumes from its checkpoint. Progress is reported by /addData/status.
+    """
     logger.info("--------------------Adding new data into db--------------------")
     try:
-        # Connect to the database and the collections
-        mongo_config = MongoDBConfig()
-        client = mongo_config.get_client()
-        db = client.data_set
-        temp_collection = db.stress_data_set_temp
-        main_collection = db.stress_data_set
-        
-        # Fetch all documents from the temp collection
-        logger.info("Getting all documents from temp collection")
-        temp_data = list(temp_collection.find())
-
-
-        print(temp_data)
-
-        # Insert documents into the main collection
-        logger.info("Inserting temp documents into main collection")
-        main_collection.insert_many(temp_data)
-        
-        # After inserting, delete the temp collection
-        logger.info("Deleting temp collection")
-        temp_collection.drop()
-
-        logger.info("--------------------Data successfullt added data into db--------------------")
-        return jsonify({
-            "message": "Data successfully moved from temp to main collection and temp collection deleted."
-        })
-    
+        migration = _migration()
+        migration.acquire()
+    except MigrationLocked as e:
+        return jsonify({"error": str(e), "status_url": "/addData/status"}), 409
     except Exception as e:
-        # Handle any exceptions (e.g., MongoDB connection issues)
         logger.error("Some error occured while adding data into db")
         return jsonify({"error": str(e)}), 500
+
+    threading.Thread(target=_run_migration, args=(migration,), name="adddata-migration", daemon=True).start()
+    return jsonify({
+        "message": "Moving data from temp to main collection.",
+        "status_url": "/addData/status"
+    }), 202
+
+
+def adddata_status():
+    """Progress and throughput of the current or last data migration."""
+    try:
+        return jsonify(_status_body(_migration().status()))
+    except Exception as e:
+        logger.error("Some error occured while reading the data migration status")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,12 @@
+from flask import jsonify
+from config.mongodbConfig import pool_stats
+from utils.logger import logger
+
+
+def db_pool_stats():
+    """Report connection pool usage and checkout wait times of this process's MongoDB client."""
+    try:
+        return jsonify(pool_stats())
+    except Exception as e:
+        logger.error("Some error occured while reading MongoDB pool stats")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,48 @@
+from flask import jsonify
+from utils.logger import logger
+from utils.training_jobs import job_manager
+
+
+def submit_training(mode):
+    """Queue a training job and return its id straight away."""
+    logger.info("--------------------Submitting %s training job--------------------", mode)
+    try:
+        job, created = job_manager.submit(mode)
+        return jsonify({
+            "job_id": job["id"],
+            "status": job["status"],
+            "mode": mode,
+            # True when an identical job was already queued or running and this request joined it
+            "coalesced": not created,
+            "status_url": f"/jobs/{job['id']}"
+        }), 202
+    except Exception as e:
+        logger.error("Some error occured while submitting training job")
+        return jsonify({"error": str(e)}), 500
+
+
+def train_stress_level():
+    """Retrain the Random Forest from scratch in the background."""
+    return submit_training("full")
+
+
+def train_stress_level_incremental():
+    """Update the Random Forest with data added since it was last trained, in the background."""
+    return submit_training("incremental")
+
+
+def train_stress_level_select():
+    """Grid-search the Random Forest and publish the smallest, fastest model within the accuracy tolerance."""
+    return submit_training("select")
+
+
+def job_status(job_id):
+    """Report status, phase timings, progress and result of a training job."""
+    try:
+        job = job_manager.get(job_id)
+    except Exception as e:
+        logger.error("Some error occured while reading training job %s", job_id)
+        return jsonify({"error": str(e)}), 500
+    if job is None:
+        return jsonify({"error": f"Unknown job id: {job_id}"}), 404
+    return jsonify(job)
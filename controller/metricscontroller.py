@@ -0,0 +1,17 @@
+from flask import Response
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+def prometheus_metrics():
+    """Expose request and stage latency histograms in the Prometheus text format."""
+    log_stats = logger.stats()
+    lines = [
+        "# HELP log_records_queued Log records waiting for the background writer.",
+        "# TYPE log_records_queued gauge",
+        f"log_records_queued {log_stats['queued']}",
+        "# HELP log_records_dropped_total Log records dropped because the log queue was full.",
+        "# TYPE log_records_dropped_total counter",
+        f"log_records_dropped_total {log_stats['dropped']}",
+    ]
+    return Response(metrics.render() + "\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -1,63 +1,271 @@
-import joblib
-from app import client
-from flask import jsonify, request
+import os
+import numpy as np
+from config.mongodbConfig import get_client
+from flask import Response, jsonify, request
+from utils.binary_payload import BINARY_MIMETYPES, NPY_MIMETYPE, PayloadError, encode_npy, parse_features
 from utils.logger import logger
+from utils.metrics import span
+from utils.micro_batcher import MicroBatcher
+from utils.model_registry import ModelHolder, registry
+from utils.startup import BACKGROUND_THREADS_AT_IMPORT
+from utils.write_buffer import create_buffer
 
-# Load the trained model (assuming the model is saved as 'random_forest_model.pkl')
-model = joblib.load('models/random_forest.pkl')
+# Load the active model version; new versions are loaded in the background and swapped in
+# Engine arrays are memory-mapped by default so pre-forked workers share them
+# With no published version yet the holder starts empty and predictions answer 503
+model_holder = ModelHolder(registry, poll_interval=float(os.environ.get("MODEL_POLL_INTERVAL_SECONDS", 5)),
+                           mmap_mode="r" if os.environ.get("MODEL_MMAP", "1") != "0" else None)
+model_holder.load_initial()
+if BACKGROUND_THREADS_AT_IMPORT:
+    model_holder.start_watcher()
 
+# Feature order expected by the model (same column order the model was trained on)
+REQUIRED_FIELDS = [
+    'snoring_range', 'respiration_rate', 'body_temperature',
+    'limb_movement', 'blood_oxygen', 'heart_rate',
+    'sleep_duration', 'age', 'weight'
+]
+
+# Concurrent single predictions are scored together in one vectorized call
+MICRO_BATCHING = os.environ.get("PREDICT_MICRO_BATCHING", "1") != "0"
+micro_batcher = MicroBatcher(lambda X: model_holder.current().engine.predict(X), n_features=len(REQUIRED_FIELDS))
+
+# Predictions are persisted in the background so responses don't wait on MongoDB
+prediction_writer = create_buffer(lambda: get_client().data_set.stress_data_set_temp)
+
+def model_unavailable():
+    """503 response for the prediction routes until the first model version is published."""
+    return jsonify({"error": "No trained model is available yet; train one with /train_stress_level"}), 503
+
+
+# Counted from the start of the request, so a batch forming meanwhile waits for this row
+@micro_batcher.expecting()
 def predict_stress_level():
     """Predict stress level based on input features."""
     logger.info("--------------------Predicting stress level--------------------")
+    if model_holder.current() is None:
+        return model_unavailable()
     try:
         # Extract data from the incoming request (expecting JSON format)
-        input_features = request.json  # Expecting a dictionary with the feature values
-
-        # Validate input (ensure all required fields are provided)
-        required_fields = [
-            'snoring_range', 'respiration_rate', 'body_temperature', 
-            'limb_movement', 'blood_oxygen', 'heart_rate', 
-            'sleep_duration', 'age', 'weight'
-        ]
-        
-        # Check if all required fields are in the input data
-        for field in required_fields:
-            if field not in input_features:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-        
-        # Prepare the input data for prediction (ensure correct order and format)
-        features = [
-            input_features.get('snoring_range'),
-            input_features.get('respiration_rate'),
-            input_features.get('body_temperature'),
-            input_features.get('limb_movement'),
-            input_features.get('blood_oxygen'),
-            input_features.get('heart_rate'),
-            input_features.get('sleep_duration'),
-            input_features.get('age'),
-            input_features.get('weight')
-        ]
-        
-        # Convert to a 2D array (model expects 2D array for prediction)
-        features = [features]  # The model expects the data in a 2D array format
-        
-        # Make the prediction using the trained model
-        prediction = model.predict(features)
-        predicted_stress_level = int(prediction[0])
-        
+        with span("parse"):
+            input_features = request.json  # Expecting a dictionary with the feature values
+
+        with span("validate"):
+            # Check if all required fields are in the input data
+            for field in REQUIRED_FIELDS:
+                if field not in input_features:
+                    return jsonify({"error": f"Missing required field: {field}"}), 400
+
+            # Prepare the input data for prediction (ensure correct order and format)
+            features = [input_features.get(field) for field in REQUIRED_FIELDS]
+
+        # Make the prediction using the compiled model of the active version
+        with span("predict"):
+            if MICRO_BATCHING:
+                predicted_stress_level = int(micro_batcher.submit(features))
+            else:
+                predicted_stress_level = int(model_holder.current().engine.predict_one(features))
+
         input_features['stress_level'] = predicted_stress_level
-        
-        db = client.data_set
-        collection = db.stress_data_set_temp
-        
-        # Save the data (input features + prediction) into MongoDB
-        collection.insert_one(input_features)
+
+        # Queue the data (input features + prediction) for insertion into MongoDB
+        with span("db_write"):
+            prediction_writer.put(input_features)
 
         # Return the prediction in the response
         logger.info("--------------------Stress level predicted successfully--------------------")
-        return jsonify({"predicted_stress_level": predicted_stress_level})
+        with span("serialize"):
+            return jsonify({"predicted_stress_level": predicted_stress_level})
 
     except Exception as e:
         # Handle any errors (e.g., malformed input data)
         logger.error("Some error occured while predicting stress level")
         return jsonify({"error": str(e)}), 500
+
+
+def validate_readings(readings):
+    """
+    Validate a block of readings and build the feature matrix for the valid ones.
+
+    Returns a tuple (features, valid_indices, errors) where features is a 2-D float
+    array in REQUIRED_FIELDS order (one row per valid reading), valid_indices maps
+    each matrix row back to its position in `readings`, and errors is a list of
+    {"index", "error"} dicts for the rejected readings.
+    """
+    rows = []
+    valid_indices = []
+    errors = []
+    for index, reading in enumerate(readings):
+        if not isinstance(reading, dict):
+            errors.append({"index": index, "error": "Reading must be a JSON object"})
+            continue
+        missing = [field for field in REQUIRED_FIELDS if field not in reading]
+        if missing:
+            errors.append({"index": index, "error": f"Missing required field: {missing[0]}"})
+            continue
+        try:
+            row = [float(reading[field]) for field in REQUIRED_FIELDS]
+        except (TypeError, ValueError):
+            errors.append({"index": index, "error": "All required fields must be numeric"})
+            continue
+        rows.append(row)
+        valid_indices.append(index)
+
+    features = np.array(rows, dtype=np.float64).reshape(len(rows), len(REQUIRED_FIELDS))
+    return features, valid_indices, errors
+
+
+def predict_stress_level_batch():
+    """Predict stress levels for a batch of readings in a single model call."""
+    logger.info("--------------------Predicting stress level batch--------------------")
+    if model_holder.current() is None:
+        return model_unavailable()
+    if request.mimetype in BINARY_MIMETYPES:
+        return predict_stress_level_binary_batch()
+    try:
+        # Accept either {"readings": [...]} or a bare list of readings
+        with span("parse"):
+            payload = request.json
+        readings = payload.get("readings") if isinstance(payload, dict) else payload
+        if not isinstance(readings, list) or not readings:
+            return jsonify({"error": "Expected a non-empty list of readings"}), 400
+
+        # Validate the whole block up front; bad rows are reported, not fatal
+        with span("validate"):
+            features, valid_indices, errors = validate_readings(readings)
+
+        predictions = [None] * len(readings)
+        persisted = 0
+        if valid_indices:
+            # One model call for every valid row
+            with span("predict"):
+                predicted = model_holder.current().engine.predict(features)
+
+            documents = []
+            for row, index in enumerate(valid_indices):
+                predicted_stress_level = int(predicted[row])
+                predictions[index] = predicted_stress_level
+                document = dict(readings[index])
+                document['stress_level'] = predicted_stress_level
+                documents.append(document)
+
+            # Queue all scored readings; the writer persists them with unordered bulk inserts
+            with span("db_write"):
+                persisted = prediction_writer.put_many(documents)
+
+        logger.info("--------------------Stress level batch predicted successfully--------------------")
+        with span("serialize"):
+            return jsonify({
+                "predicted_stress_levels": predictions,
+                "predicted": len(valid_indices),
+                # Scored readings accepted for storage, and those dropped because the write queue was full
+                "persisted": persisted,
+                "dropped": len(valid_indices) - persisted,
+                "errors": errors
+            })
+
+    except Exception as e:
+        # Handle any errors (e.g., malformed input data)
+        logger.error("Some error occured while predicting stress level batch")
+        return jsonify({"error": str(e)}), 500
+
+
+def write_buffer_stats():
+    """Report queue depth, flush latency and dropped writes of the prediction writer."""
+    return jsonify(prediction_writer.stats())
+
+
+def predict_stress_level_binary_batch():
+    """
+    Predict stress levels for a binary feature matrix (see utils/binary_payload.py).
+
+    Columns are in REQUIRED_FIELDS order. The body is scored as a NumPy view of the
+    request bytes. Responds with JSON like the JSON batch path, or with an int64 .npy
+    of predictions (-1 for rejected rows) when the client accepts application/x-npy;
+    the persisted and dropped counts then come in the X-Persisted-Rows/X-Dropped-Rows headers.
+    """
+    try:
+        with span("parse"):
+            features = parse_features(request.get_data(cache=False), request.mimetype, len(REQUIRED_FIELDS))
+
+        with span("validate"):
+            # Same float32 view the engine evaluates; a no-op for float32 payloads
+            features32 = np.asarray(features, dtype=np.float32)
+            rejected = np.isinf(features32).any(axis=1)
+            valid_indices = np.flatnonzero(~rejected)
+            errors = [{"index": int(index), "error": "Values must be finite and fit in float32"}
+                      for index in np.flatnonzero(rejected)]
+
+        predictions = np.full(len(features32), -1, dtype=np.int64)
+        persisted = 0
+        if len(valid_indices):
+            with span("predict"):
+                scored = features32 if not errors else features32[valid_indices]
+                predictions[valid_indices] = model_holder.current().engine.predict(scored)
+
+            # Stored documents look like the ones the JSON paths write
+            with span("db_write"):
+                rows = features[valid_indices].tolist()
+                persisted = prediction_writer.put_many([
+                    dict(zip(REQUIRED_FIELDS, row), stress_level=stress_level)
+                    for row, stress_level in zip(rows, predictions[valid_indices].tolist())
+                ])
+
+        logger.info("--------------------Stress level binary batch predicted successfully--------------------")
+        with span("serialize"):
+            if request.accept_mimetypes.best_match(["application/json", NPY_MIMETYPE]) == NPY_MIMETYPE:
+                return Response(encode_npy(predictions), mimetype=NPY_MIMETYPE,
+                                headers={"X-Rejected-Rows": str(len(errors)),
+                                         "X-Persisted-Rows": str(persisted),
+                                         "X-Dropped-Rows": str(len(valid_indices) - persisted)})
+            return jsonify({
+                "predicted_stress_levels": [None if rejected_row else level
+                                            for rejected_row, level in zip(rejected.tolist(), predictions.tolist())],
+                "predicted": int(len(valid_indices)),
+                "persisted": persisted,
+                "dropped": int(len(valid_indices)) - persisted,
+                "errors": errors
+            })
+
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Some error occured while predicting stress level binary batch")
+        return jsonify({"error": str(e)}), 500
+
+
+def micro_batch_stats():
+    """Report the batch-size distribution and queue wait of the prediction micro-batcher."""
+    return jsonify(dict(micro_batcher.stats(), enabled=MICRO_BATCHING))
+
+
+def warmup(start_batcher=BACKGROUND_THREADS_AT_IMPORT):
+    """
+    Run a single and a batch prediction through the active engine so first requests hit warm code paths.
+    The micro-batcher is only warmed with start_batcher, since that starts its scheduler thread;
+    a preloading gunicorn master leaves it to each worker's post_fork.
+    Returns False (and does nothing) while no model is loaded.
+    """
+    active = model_holder.current()
+    if active is None:
+        return False
+    engine = active.engine
+    engine.predict_one([0.0] * len(REQUIRED_FIELDS))
+    engine.predict(np.zeros((64, len(REQUIRED_FIELDS))))
+    if MICRO_BATCHING and start_batcher:
+        micro_batcher.submit([0.0] * len(REQUIRED_FIELDS))
+    return True
+
+
+def model_version():
+    """Report the active model version and how long it took to load."""
+    active = model_holder.current()
+    if active is None:
+        return model_unavailable()
+    return jsonify({
+        "version": active.version,
+        "checksum": active.checksum,
+        "created_at": active.created_at,
+        "loaded_at": active.loaded_at,
+        "load_seconds": active.load_seconds
+    })
@@ -0,0 +1,96 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify, request
+from utils.logger import logger
+from utils.metrics import span
+from controller.predictioncontroller import (MICRO_BATCHING, REQUIRED_FIELDS, micro_batcher, model_holder,
+                                             model_unavailable, prediction_writer)
+from controller.reccomdationcontroller import (compute_recommendations, fetch_recommendation_inputs,
+                                               recommendation_cache, recommendation_cache_key)
+
+# Threads reading user histories while the request thread predicts
+HISTORY_FETCH_THREADS = int(os.environ.get("HISTORY_FETCH_THREADS", 16))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _history_executor():
+    # Threads don't survive fork, so a forked worker starts its own pool
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=HISTORY_FETCH_THREADS, thread_name_prefix="history-fetch")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+@micro_batcher.expecting()
+def predict_and_recommend():
+    """
+    Predict the stress level of a reading and recommend for it in one request.
+
+    Same input as /predict_stress_level plus the /recommendation fields (user_id, top_k).
+    The body is parsed and validated once; the user's history is read on a pool thread
+    while the model scores the reading, and the reading is queued for storage like
+    /predict_stress_level does. Responds with the /recommendation body plus predicted_stress_level.
+    """
+    logger.info("--------------------Predicting stress level and recommending--------------------")
+    if model_holder.current() is None:
+        return model_unavailable()
+    try:
+        with span("parse"):
+            input_features = request.json
+
+        with span("validate"):
+            if not isinstance(input_features, dict):
+                return jsonify({"error": "Expected a JSON object"}), 400
+            for field in REQUIRED_FIELDS:
+                if field not in input_features:
+                    return jsonify({"error": f"Missing required field: {field}"}), 400
+            features = [input_features.get(field) for field in REQUIRED_FIELDS]
+
+        user_id = input_features.get("user_id")
+        top_k = input_features.get("top_k")
+
+        # The cache key only covers the impacted features, so a hit needs no history read
+        with span("cache"):
+            cache_key = recommendation_cache_key(user_id, input_features, top_k)
+            recommendations = recommendation_cache.get(cache_key)
+        history = None
+        if recommendations is None:
+            # Read first, so a history change during scoring keeps the result out of the cache
+            generation = recommendation_cache.generation(str(user_id))
+            history = _history_executor().submit(fetch_recommendation_inputs, user_id)
+
+        with span("predict"):
+            if MICRO_BATCHING:
+                predicted_stress_level = int(micro_batcher.submit(features))
+            else:
+                predicted_stress_level = int(model_holder.current().engine.predict_one(features))
+
+        # The recommendation step sees the reading with its stress level, as a separate /recommendation call would
+        input_features['stress_level'] = predicted_stress_level
+
+        # A copy, since the writer thread adds _id while this thread still reads the reading
+        with span("db_write"):
+            prediction_writer.put(dict(input_features))
+
+        if recommendations is None:
+            # Only the part of the history read that outlasted the prediction is spent waiting here
+            with span("db_read"):
+                prefetched = history.result()
+            recommendations = compute_recommendations(input_features, user_id, top_k, prefetched=prefetched)
+            with span("cache"):
+                recommendation_cache.put(str(user_id), cache_key, recommendations, generation)
+
+        logger.info("--------------------Stress level predicted and recommendations generated--------------------")
+        with span("serialize"):
+            return jsonify(dict(recommendations, predicted_stress_level=predicted_stress_level))
+
+    except Exception as e:
+        logger.error("Some error occured while predicting stress level and recommending")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,7 @@
+from flask import jsonify
+from utils.startup import startup
+
+
+def startup_report():
+    """Report how long each startup phase of this process took."""
+    return jsonify(startup.report())
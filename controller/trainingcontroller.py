@@ -1,64 +1,363 @@
+import io
+import os
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
 from flask import jsonify
-import pandas as pd
-import joblib
+import numpy as np
+from bson import ObjectId
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GridSearchCV, train_test_split
 from sklearn.metrics import accuracy_score
-from config.mongodbConfig import MongoDBConfig
+from config.mongodbConfig import get_client
+from utils.data_loader import load_training_arrays
+from utils.forest_engine import ARRAY_NAMES, FlatForest
 from utils.logger import logger
-mongo_config = MongoDBConfig()
-client = mongo_config.get_client()
+from utils.training_snapshot import load_training_data
+from utils.model_registry import registry
 
-def train_stress_level():
-    """Train or retrain Random Forest model for stress level prediction."""
-    logger.info("--------------------Training Random forest for detecting stress level--------------------")
-    try:
-        # Fetch the data from MongoDB
-        db = client.data_set
+# Incremental training settings
+INCREMENTAL_TREES = int(os.environ.get("INCREMENTAL_TREES", 10))  # trees added per incremental update
+MAX_TREES = int(os.environ.get("MAX_TREES", 150))  # oldest trees are retired past this size
+INCREMENTAL_WINDOW_ROWS = int(os.environ.get("INCREMENTAL_WINDOW_ROWS", 5000))  # already-trained rows mixed in
+FULL_REBUILD_EVERY = int(os.environ.get("FULL_REBUILD_EVERY", 10))  # incremental updates between full rebuilds
+FULL_REBUILD_MAX_AGE_HOURS = float(os.environ.get("FULL_REBUILD_MAX_AGE_HOURS", 24 * 7))
+
+# Model selection settings ("none" means unbounded depth)
+DEFAULT_HYPERPARAMETERS = {"n_estimators": 100}
+SELECTION_N_ESTIMATORS = os.environ.get("SELECTION_N_ESTIMATORS", "25,50,100")
+SELECTION_MAX_DEPTHS = os.environ.get("SELECTION_MAX_DEPTHS", "8,12,16,none")
+SELECTION_MIN_SAMPLES_LEAF = os.environ.get("SELECTION_MIN_SAMPLES_LEAF", "1,2,5")
+SELECTION_CV_FOLDS = int(os.environ.get("SELECTION_CV_FOLDS", 5))
+# Candidates within this much (absolute) of the best cross-validated accuracy are eligible
+SELECTION_ACCURACY_TOLERANCE = float(os.environ.get("SELECTION_ACCURACY_TOLERANCE", 0.01))
+SELECTION_LATENCY_REPEATS = int(os.environ.get("SELECTION_LATENCY_REPEATS", 200))
+SELECTION_BATCH_ROWS = int(os.environ.get("SELECTION_BATCH_ROWS", 1000))
+
+
+def _no_phase(name):
+    return nullcontext()
+
+
+def fit_full_model(phase=_no_phase):
+    """
+    Fit a new forest on the whole collection and publish it. Returns a result dict.
+
+    phase(name) is a context manager wrapped around each step (load, split, fit,
+    evaluate, save) so a job runner can time them.
+    """
+    # Fetch the data from MongoDB
+    with phase("load"):
+        db = get_client().data_set
         collection = db.stress_data_set
-        logger.info("Getting all documents from db")
-        documents = collection.find()
-        data = pd.DataFrame(list(documents))
-        data.drop(columns=['_id'], inplace=True, errors='ignore')
-        # Check if the data is available
-        if data.empty:
-            logger.info("No data found in db! Cannot train model on no data!")
-            return jsonify({
-                "message": "No data found in the MongoDB collection.",
-                "accuracy": None
-            })
-
-        # Prepare the features (X) and target (y)
-        # Assuming 'stress_level' is the target column
-        X = data.drop(columns=['stress_level'])
-        y = data['stress_level']
-
-        # Split the data into training and testing sets
+        logger.info("Syncing the local training snapshot from db")
+        X, y, last_id = load_training_data(collection)
+        watermark_rows = _rows_through(collection, last_id)
+    # Check if the data is available
+    if len(y) == 0:
+        logger.info("No data found in db! Cannot train model on no data!")
+        return {
+            "message": "No data found in the MongoDB collection.",
+            "accuracy": None
+        }
+
+    # Split the data into training and testing sets
+    with phase("split"):
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-        # Initialize and train the Random Forest model
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
+    # Initialize and train the Random Forest model on every core
+    # Keep the hyperparameters picked by the last model selection run, if any
+    with phase("fit"):
+        hyperparameters = _active_hyperparameters()
+        model = RandomForestClassifier(**hyperparameters, random_state=42, n_jobs=-1)
         model.fit(X_train, y_train)
 
-        # Make predictions and evaluate accuracy
+    # Make predictions and evaluate accuracy
+    with phase("evaluate"):
         logger.info("Making predictions and evaluating accuracy")
-        # y_pred = model.predict(X_test)
-        # accuracy = accuracy_score(y_test, y_pred)
-        # logger.info("Accuracy of mode: ",accuracy)
+        y_pred = model.predict(X_test)
+        accuracy = float(accuracy_score(y_test, y_pred))
+        logger.info("Accuracy of model: %s", accuracy)
 
-        # Optionally, save the model for future use (using joblib or pickle)
+    # Publish the model as a new version; serving processes pick it up and swap it in
+    with phase("save"):
         logger.info("Saving the trained model")
-        joblib.dump(model, 'models/random_forest.pkl')
+        manifest = registry.publish(model, {
+            "mode": "full",
+            "trained_rows": len(y),
+            "watermark": str(last_id) if last_id else None,
+            "watermark_rows": watermark_rows,
+            "incremental_updates": 0,
+            "last_full_build": datetime.now(timezone.utc).isoformat(),
+            "accuracy": accuracy,
+            "hyperparameters": hyperparameters
+        })
+    return {
+        "message": "Random Forest model retrained successfully!",
+        "version": manifest["version"],
+        "mode": "full",
+        "accuracy": accuracy
+    }
+
+
+def _active_hyperparameters():
+    """Forest hyperparameters recorded with the active version, or the defaults."""
+    version = registry.current_version()
+    if version is None:
+        return dict(DEFAULT_HYPERPARAMETERS)
+    try:
+        hyperparameters = registry.manifest(version).get("metadata", {}).get("hyperparameters")
+    except OSError:
+        hyperparameters = None
+    return dict(hyperparameters or DEFAULT_HYPERPARAMETERS)
+
+
+def _rows_through(collection, last_id):
+    """Number of documents with an _id up to last_id, recorded so late arrivals below it can be detected."""
+    if last_id is None:
+        return 0
+    return collection.count_documents({"_id": {"$lte": last_id}})
+
+
+def _needs_full_rebuild(metadata):
+    """Reason a full rebuild is due, or None if an incremental update is fine."""
+    if not metadata.get("watermark"):
+        return "no training watermark recorded"
+    if "watermark_rows" not in metadata:
+        return "no row count recorded at the training watermark"
+    if metadata.get("incremental_updates", 0) >= FULL_REBUILD_EVERY:
+        return f"{FULL_REBUILD_EVERY} incremental updates since the last full build"
+    last_full_build = metadata.get("last_full_build")
+    if last_full_build:
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(last_full_build)
+        if age > timedelta(hours=FULL_REBUILD_MAX_AGE_HOURS):
+            return f"last full build is older than {FULL_REBUILD_MAX_AGE_HOURS} hours"
+    return None
+
+
+def update_model_incrementally(phase=_no_phase):
+    """
+    Grow the active forest with trees fitted on rows added since it was trained.
+
+    New rows are those with an _id above the watermark stored with the active
+    version. _ids are only roughly ordered across clients, so a document can land
+    below the watermark after training; the number of documents up to the watermark
+    is compared with the count recorded at training time, and a mismatch (late
+    arrivals or deletions) forces a full rebuild. New rows are mixed with a window of the most recent already-trained rows
+    so every class stays represented. Falls back to a full rebuild when the
+    rebuild policy says so or the class set changed.
+    """
+    version = registry.current_version()
+    if version is None:
+        logger.info("No model published yet, running a full build")
+        return fit_full_model(phase)
+
+    model, manifest = registry.load(version)
+    metadata = manifest.get("metadata", {})
+    reason = _needs_full_rebuild(metadata)
+    if reason:
+        logger.info("Running a full rebuild: %s", reason)
+        return fit_full_model(phase)
+
+    db = get_client().data_set
+    collection = db.stress_data_set
+    watermark = ObjectId(metadata["watermark"])
+
+    # Documents that arrived below the watermark would never be picked up as new rows
+    watermark_rows = _rows_through(collection, watermark)
+    if watermark_rows != metadata["watermark_rows"]:
+        logger.info("Running a full rebuild: %s documents up to the watermark, %s when trained",
+                    watermark_rows, metadata["watermark_rows"])
+        return fit_full_model(phase)
+
+    with phase("load"):
+        logger.info("Getting documents added after %s", watermark)
+        X_new, y_new, last_id = load_training_arrays(collection, query={"_id": {"$gt": watermark}}, with_ids=True)
+        if len(y_new) == 0:
+            logger.info("No new data since the last training run")
+            return {
+                "message": "No new data since the last training run.",
+                "version": version,
+                "mode": "incremental"
+            }
+
+        new_watermark_rows = _rows_through(collection, last_id)
+        # Mix in the most recent already-trained rows
+        X_window, y_window, _ = load_training_arrays(
+            collection, query={"_id": {"$lte": watermark}}, sort=[("_id", -1)], limit=INCREMENTAL_WINDOW_ROWS
+        )
+        X = np.vstack([X_new, X_window])
+        y = np.concatenate([y_new, y_window])
+
+    # warm_start refits classes_ from y, so the class set has to stay the same
+    if not np.array_equal(np.unique(y), model.classes_):
+        logger.info("Class set changed, running a full rebuild")
+        return fit_full_model(phase)
+
+    with phase("fit"):
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_TREES, n_jobs=-1)
+        model.fit(X, y)
+
+        # Retire the oldest trees past the size cap
+        retired = max(0, len(model.estimators_) - MAX_TREES)
+        if retired:
+            model.estimators_ = model.estimators_[retired:]
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+
+    with phase("save"):
+        logger.info("Saving the updated model")
+        manifest = registry.publish(model, {
+            "mode": "incremental",
+            "parent_version": version,
+            "trained_rows": metadata.get("trained_rows", 0) + len(y_new),
+            "watermark": str(last_id),
+            "watermark_rows": new_watermark_rows,
+            "incremental_updates": metadata.get("incremental_updates", 0) + 1,
+            "last_full_build": metadata.get("last_full_build"),
+            "hyperparameters": metadata.get("hyperparameters")
+        })
+    return {
+        "message": "Random Forest model updated incrementally!",
+        "version": manifest["version"],
+        "mode": "incremental",
+        "new_rows": len(y_new),
+        "trees": len(model.estimators_),
+        "retired_trees": retired
+    }
+
+
+def _parse_grid(value, cast):
+    return [None if item.strip().lower() == "none" else cast(item) for item in value.split(",") if item.strip()]
+
+
+def _selection_grid():
+    return {
+        "n_estimators": _parse_grid(SELECTION_N_ESTIMATORS, int),
+        "max_depth": _parse_grid(SELECTION_MAX_DEPTHS, int),
+        "min_samples_leaf": _parse_grid(SELECTION_MIN_SAMPLES_LEAF, int),
+    }
+
+
+def _measure_candidate(model, X_test, y_test):
+    """Holdout accuracy, serving latency (on the compiled engine) and size of a fitted forest."""
+    accuracy = float(accuracy_score(y_test, model.predict(X_test)))
+    buffer = io.BytesIO()
+    import joblib
+    joblib.dump(model, buffer)
+
+    engine = FlatForest.from_sklearn(model)
+    row = X_test[:1]
+    engine.predict_one(row)
+    timings = []
+    for _ in range(SELECTION_LATENCY_REPEATS):
+        started = time.perf_counter()
+        engine.predict_one(row)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    batch = X_test[:SELECTION_BATCH_ROWS]
+    started = time.perf_counter()
+    engine.predict(batch)
+    batch_seconds = time.perf_counter() - started
+    return {
+        "holdout_accuracy": accuracy,
+        "single_row_ms_p50": round(timings[len(timings) // 2] * 1000, 4),
+        "single_row_ms_p95": round(timings[int(len(timings) * 0.95)] * 1000, 4),
+        "batch_rows": len(batch),
+        "batch_ms": round(batch_seconds * 1000, 3),
+        "batch_rows_per_second": round(len(batch) / batch_seconds, 1) if batch_seconds else None,
+        "model_size_bytes": len(buffer.getvalue()),
+        "engine_size_bytes": int(sum(getattr(engine, name).nbytes for name in ARRAY_NAMES)),
+        "nodes": int(len(engine.feature)),
+    }
+
+
+def select_model(phase=_no_phase):
+    """
+    Grid-search forest hyperparameters and publish the smallest, fastest candidate
+    whose cross-validated accuracy is within SELECTION_ACCURACY_TOLERANCE of the best.
+
+    Cross-validation runs the candidates in parallel across cores; every candidate is
+    then refitted on the training split and measured for holdout accuracy, single-row
+    and batch latency on the serving engine, and serialized size. Returns the full report.
+    """
+    with phase("load"):
+        db = get_client().data_set
+        collection = db.stress_data_set
+        logger.info("Syncing the local training snapshot from db")
+        X, y, last_id = load_training_data(collection)
+        watermark_rows = _rows_through(collection, last_id)
+    if len(y) == 0:
+        logger.info("No data found in db! Cannot train model on no data!")
+        return {
+            "message": "No data found in the MongoDB collection.",
+            "accuracy": None
+        }
+
+    with phase("split"):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Cross-validate every candidate; single-threaded forests so the folds fill the cores
+    with phase("search"):
+        grid = _selection_grid()
+        search = GridSearchCV(RandomForestClassifier(random_state=42, n_jobs=1), grid, cv=SELECTION_CV_FOLDS,
+                              scoring="accuracy", n_jobs=-1, refit=False)
+        search.fit(X_train, y_train)
+        logger.info("Cross-validated %s candidates", len(search.cv_results_["params"]))
+
+    with phase("measure"):
+        candidates = []
+        for params, mean, std, fit_time in zip(search.cv_results_["params"], search.cv_results_["mean_test_score"],
+                                               search.cv_results_["std_test_score"], search.cv_results_["mean_fit_time"]):
+            started = time.perf_counter()
+            model = RandomForestClassifier(**params, random_state=42, n_jobs=-1).fit(X_train, y_train)
+            candidate = {
+                "params": params,
+                "cv_accuracy": round(float(mean), 5),
+                "cv_accuracy_std": round(float(std), 5),
+                "fit_seconds": round(time.perf_counter() - started, 3),
+                "cv_fit_seconds": round(float(fit_time), 3),
+            }
+            candidate.update(_measure_candidate(model, X_test, y_test))
+            candidates.append((candidate, model))
+
+        best_accuracy = max(candidate["cv_accuracy"] for candidate, _ in candidates)
+        for candidate, _ in candidates:
+            candidate["eligible"] = candidate["cv_accuracy"] >= best_accuracy - SELECTION_ACCURACY_TOLERANCE
+        # Smallest first, then fastest single-row prediction
+        selected, model = min(
+            ((candidate, model) for candidate, model in candidates if candidate["eligible"]),
+            key=lambda pair: (pair[0]["engine_size_bytes"], pair[0]["single_row_ms_p50"])
+        )
+        selected["selected"] = True
+        logger.info("Selected %s (cv accuracy %s, best %s)", selected["params"], selected["cv_accuracy"], best_accuracy)
 
-        logger.info("--------------------Random Forest trained successfully--------------------")
-        return jsonify({
-            "message": "Random Forest model retrained successfully!",
-            # "accuracy": accuracy
+    with phase("save"):
+        logger.info("Saving the selected model")
+        manifest = registry.publish(model, {
+            "mode": "select",
+            "trained_rows": len(y_train),
+            "watermark": str(last_id) if last_id else None,
+            "watermark_rows": watermark_rows,
+            "incremental_updates": 0,
+            "last_full_build": datetime.now(timezone.utc).isoformat(),
+            "accuracy": selected["holdout_accuracy"],
+            "hyperparameters": selected["params"],
+            "selection": {"tolerance": SELECTION_ACCURACY_TOLERANCE, "best_cv_accuracy": best_accuracy,
+                          "candidates": len(candidates)}
         })
-    except Exception as e:
-        # Handle any exceptions (e.g., MongoDB connection issues)
-        logger.error("Some error occured while training Random Forest")
-        return jsonify({"error": str(e)}), 500
+    return {
+        "message": "Selected and published the smallest, fastest Random Forest within the accuracy tolerance.",
+        "version": manifest["version"],
+        "mode": "select",
+        "accuracy": selected["holdout_accuracy"],
+        "selected": selected,
+        "tolerance": SELECTION_ACCURACY_TOLERANCE,
+        "best_cv_accuracy": best_accuracy,
+        "grid": grid,
+        "report": sorted((candidate for candidate, _ in candidates),
+                         key=lambda candidate: (-candidate["cv_accuracy"], candidate["engine_size_bytes"]))
+    }
 
 
 def train_content_based():
@@ -0,0 +1,65 @@
+# Purpose: Production serving with pre-forked gunicorn workers.
+# Features:
+# The app (model, rule tables, Mongo warmup) is loaded once in the master with preload_app,
+# then forked into WEB_CONCURRENCY workers that share those pages copy-on-write.
+# Objects loaded in the master are frozen out of the garbage collector so collections
+# in the workers don't touch (and copy) the shared pages.
+# Workers are recycled gracefully after GUNICORN_MAX_REQUESTS requests (with jitter).
+# Background threads don't survive fork and would be wasted in the master, so the master
+# starts none and each worker starts its own in post_fork, along with its Mongo connections.
+#
+# Run with: gunicorn -c gunicorn.conf.py app:app
+
+import gc
+import multiprocessing
+import os
+
+# Read by the app at import time (utils/startup.py); set before preload_app imports it
+os.environ["BACKGROUND_THREADS_AT_IMPORT"] = "0"
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = True
+
+# Graceful worker recycling
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+
+
+def when_ready(server):
+    # Everything loaded so far lives for the whole process; keep the GC from scanning it after fork
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded app, forking %s workers with %s threads each", workers, threads)
+
+
+def post_fork(server, worker):
+    # The master's MongoClient is discarded after fork; open this worker's pooled connections now
+    if os.environ.get("MONGO_WARMUP", "1") != "0":
+        from config.mongodbConfig import warmup
+        try:
+            warmup()
+        except Exception as e:
+            # Connections are then opened on first use instead
+            server.log.warning("MongoDB warmup failed in worker %s: %s", worker.pid, e)
+    # The write buffer and the profile syncer start per-process on first use;
+    # the model watcher and change listener are long-running, so start them here
+    from controller.predictioncontroller import model_holder, warmup as warmup_predictions
+    model_holder.start_watcher()
+    # Pick up a version published while this worker was being forked
+    model_holder.check_for_update()
+    # Starts this worker's micro-batcher scheduler, which the master skipped
+    try:
+        warmup_predictions(start_batcher=True)
+    except Exception as e:
+        server.log.warning("Prediction warmup failed in worker %s: %s", worker.pid, e)
+    if os.environ.get("RECOMMENDATION_CACHE_LISTENER", "1") != "0":
+        from controller.reccomdationcontroller import user_changes
+        user_changes.start()
@@ -9,21 +9,96 @@ def predict_stress_level():
     from controller.predictioncontroller import predict_stress_level
     return predict_stress_level()
 
+@routes.route('/predict_stress_level/batch', methods=['POST'])
+def predict_stress_level_batch():
+    from controller.predictioncontroller import predict_stress_level_batch
+    return predict_stress_level_batch()
+
+@routes.route('/predict_stress_level/batch_stats', methods=['GET'])
+def micro_batch_stats():
+    from controller.predictioncontroller import micro_batch_stats
+    return micro_batch_stats()
+
+@routes.route('/predict_stress_level/write_stats', methods=['GET'])
+def write_buffer_stats():
+    from controller.predictioncontroller import write_buffer_stats
+    return write_buffer_stats()
+
+@routes.route('/model/version', methods=['GET'])
+def model_version():
+    from controller.predictioncontroller import model_version
+    return model_version()
+
 @routes.route('/recommendation', methods=['POST'])
 def recommendation():
     from controller.reccomdationcontroller import recommendation
     return recommendation()
 
+@routes.route('/predict_and_recommend', methods=['POST'])
+def predict_and_recommend():
+    from controller.predictrecommendcontroller import predict_and_recommend
+    return predict_and_recommend()
+
+@routes.route('/recommendation/cache_stats', methods=['GET'])
+def recommendation_cache_stats():
+    from controller.reccomdationcontroller import recommendation_cache_stats
+    return recommendation_cache_stats()
+
+@routes.route('/recommendation/profiles/backfill', methods=['POST'])
+def backfill_profiles():
+    from controller.reccomdationcontroller import backfill_profiles
+    return backfill_profiles()
+
+@routes.route('/recommendation/cold/batch', methods=['POST'])
+def cold_recommendations_batch():
+    from controller.reccomdationcontroller import cold_recommendations_batch
+    return cold_recommendations_batch()
+
+@routes.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    from controller.metricscontroller import prometheus_metrics
+    return prometheus_metrics()
+
+@routes.route('/startup', methods=['GET'])
+def startup_report():
+    from controller.startupcontroller import startup_report
+    return startup_report()
+
+@routes.route('/db/pool_stats', methods=['GET'])
+def db_pool_stats():
+    from controller.dbcontroller import db_pool_stats
+    return db_pool_stats()
+
 @routes.route('/addData', methods=['POST'])
 def adddata():
     from controller.adddatacontroller import adddata
     return adddata()
 
+@routes.route('/addData/status', methods=['GET'])
+def adddata_status():
+    from controller.adddatacontroller import adddata_status
+    return adddata_status()
+
 @routes.route('/train_stress_level', methods=['GET'])
 def train_stress_level():
-    from controller.trainingcontroller import train_stress_level
+    from controller.jobcontroller import train_stress_level
     return train_stress_level()
 
+@routes.route('/train_stress_level/incremental', methods=['GET'])
+def train_stress_level_incremental():
+    from controller.jobcontroller import train_stress_level_incremental
+    return train_stress_level_incremental()
+
+@routes.route('/train_stress_level/select', methods=['GET'])
+def train_stress_level_select():
+    from controller.jobcontroller import train_stress_level_select
+    return train_stress_level_select()
+
+@routes.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    from controller.jobcontroller import job_status
+    return job_status(job_id)
+
 @routes.route('/train_content_based', methods=['GET'])
 def train_content_based():
     from controller.trainingcontroller import train_content_based
@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+RandomForestClassifier = pytest.importorskip("sklearn.ensemble").RandomForestClassifier
+
+from utils.forest_engine import CHUNK_ROWS, FlatForest  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def forest():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, size=(600, 9))
+    y = (X[:, 0] + X[:, 3] > 100).astype(int) + (X[:, 5] > 70).astype(int) * 2
+    # Missing values in training, so the trees learn which side NaN goes to
+    X[rng.random(X.shape) < 0.05] = np.nan
+    model = RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(X, y)
+    return model, FlatForest.from_sklearn(model), X
+
+
+def on_threshold_rows(engine, X):
+    # One row per split node, with that node's feature set exactly to its threshold
+    split_nodes = np.flatnonzero(engine.left != np.arange(len(engine.left)))
+    # Splits that only route missing values have an infinite threshold, which isn't valid input
+    split_nodes = split_nodes[np.isfinite(engine.threshold[split_nodes])]
+    rows = X[np.arange(len(split_nodes)) % len(X)].copy()
+    rows[np.arange(len(split_nodes)), engine.feature[split_nodes]] = engine.threshold[split_nodes]
+    return rows
+
+
+def test_parity_with_sklearn(forest):
+    model, engine, X = forest
+    rng = np.random.default_rng(1)
+    random_rows = rng.uniform(-10, 110, size=(CHUNK_ROWS + 500, X.shape[1]))
+    nan_rows = random_rows[:300].copy()
+    nan_rows[rng.random(nan_rows.shape) < 0.3] = np.nan
+    for rows in (X, random_rows, nan_rows, on_threshold_rows(engine, np.nan_to_num(X))):
+        np.testing.assert_array_equal(engine.predict(rows), model.predict(rows))
+        np.testing.assert_allclose(engine.predict_proba(rows), model.predict_proba(rows), rtol=0, atol=1e-12)
+
+
+def test_predict_one_and_empty_input(forest):
+    model, engine, X = forest
+    assert engine.predict_one(X[0].tolist()) == model.predict(X[:1])[0]
+    assert engine.predict_proba(np.empty((0, X.shape[1]))).shape == (0, engine.values.shape[1])
+
+
+def test_rejects_bad_input(forest):
+    _, engine, X = forest
+    with pytest.raises(ValueError):
+        engine.predict(np.full((1, X.shape[1]), np.inf))
+    with pytest.raises(ValueError):
+        engine.predict(np.zeros((1, X.shape[1] + 1)))
+
+
+def test_save_and_memory_mapped_load(forest, tmp_path):
+    _, engine, X = forest
+    engine.save(tmp_path / "forest")
+    loaded = FlatForest.load(tmp_path / "forest", mmap_mode="r")
+    np.testing.assert_array_equal(loaded.predict(np.nan_to_num(X)), engine.predict(np.nan_to_num(X)))
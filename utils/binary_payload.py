@@ -0,0 +1,106 @@
+# Purpose: Binary feature-matrix payloads for bulk prediction.
+# Features:
+# Parses request bodies into a (rows, columns) NumPy view with np.frombuffer, without
+# copying and without building a dict per reading.
+# Two formats:
+#   application/x-npy             a NumPy .npy file holding a 2-D little-endian float32/float64 array
+#   application/x-stress-matrix   a 16-byte header followed by row-major little-endian floats:
+#       magic  4s   b"STRM"
+#       version u2  1
+#       columns u2  number of columns (must match the model's features)
+#       rows   u4   number of rows
+#       dtype  u1   1 = float32, 2 = float64
+#       reserved 3x
+# Also encodes matrices for upload clients and predictions back to .npy.
+
+import io
+import struct
+import numpy as np
+
+NPY_MIMETYPE = "application/x-npy"
+MATRIX_MIMETYPE = "application/x-stress-matrix"
+BINARY_MIMETYPES = (NPY_MIMETYPE, MATRIX_MIMETYPE)
+
+MATRIX_MAGIC = b"STRM"
+MATRIX_VERSION = 1
+MATRIX_HEADER = struct.Struct("<4sHHIB3x")
+MATRIX_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f8")}
+
+
+class PayloadError(ValueError):
+    """The request body isn't a valid feature matrix."""
+
+
+def _check_columns(columns, n_columns):
+    if columns != n_columns:
+        raise PayloadError(f"Expected {n_columns} feature columns, got {columns}")
+
+
+def parse_matrix(body, n_columns):
+    """Parse an application/x-stress-matrix body into a read-only (rows, n_columns) view."""
+    if len(body) < MATRIX_HEADER.size:
+        raise PayloadError("Payload is shorter than the matrix header")
+    magic, version, columns, rows, dtype_code = MATRIX_HEADER.unpack_from(body)
+    if magic != MATRIX_MAGIC:
+        raise PayloadError("Payload does not start with the STRM magic")
+    if version != MATRIX_VERSION:
+        raise PayloadError(f"Unsupported matrix format version {version}")
+    _check_columns(columns, n_columns)
+    dtype = MATRIX_DTYPES.get(dtype_code)
+    if dtype is None:
+        raise PayloadError(f"Unsupported dtype code {dtype_code}")
+    expected = MATRIX_HEADER.size + rows * columns * dtype.itemsize
+    if len(body) != expected:
+        raise PayloadError(f"Payload has {len(body)} bytes, header describes {expected}")
+    return np.frombuffer(body, dtype=dtype, count=rows * columns, offset=MATRIX_HEADER.size).reshape(rows, columns)
+
+
+def parse_npy(body, n_columns):
+    """Parse a .npy body into a read-only (rows, n_columns) view of the request bytes."""
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise PayloadError(f"Invalid .npy payload: {e}")
+    if dtype.kind != "f" or dtype.itemsize not in (4, 8) or dtype.byteorder == ">":
+        raise PayloadError(f"Expected little-endian float32 or float64 data, got {dtype.str}")
+    if len(shape) != 2:
+        raise PayloadError(f"Expected a 2-D array, got shape {shape}")
+    _check_columns(shape[1], n_columns)
+    offset = stream.tell()
+    count = shape[0] * shape[1]
+    if len(body) != offset + count * dtype.itemsize:
+        raise PayloadError("Payload size does not match the .npy header")
+    data = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+    if fortran_order:
+        # Column-major data is the transpose of a row-major (columns, rows) block; still a view
+        return data.reshape(shape[1], shape[0]).T
+    return data.reshape(shape)
+
+
+def parse_features(body, mimetype, n_columns):
+    """Parse a body of one of BINARY_MIMETYPES into a (rows, n_columns) float array."""
+    if mimetype == NPY_MIMETYPE:
+        return parse_npy(body, n_columns)
+    if mimetype == MATRIX_MIMETYPE:
+        return parse_matrix(body, n_columns)
+    raise PayloadError(f"Unsupported content type {mimetype}")
+
+
+def encode_matrix(array, dtype="<f4"):
+    """Encode a 2-D array as an application/x-stress-matrix body (used by upload clients)."""
+    array = np.ascontiguousarray(array, dtype=dtype)
+    code = next(code for code, known in MATRIX_DTYPES.items() if known == array.dtype)
+    rows, columns = array.shape
+    return MATRIX_HEADER.pack(MATRIX_MAGIC, MATRIX_VERSION, columns, rows, code) + array.tobytes()
+
+
+def encode_npy(array):
+    """Serialize an array as .npy bytes."""
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return buffer.getvalue()
@@ -0,0 +1,106 @@
+# Purpose: Notify the app when a user's stored history changes.
+# Features:
+# Watches MongoDB change streams on the user collections from a background thread.
+# Subscribers are called with the changed document's userId (as a string), or with
+# None when the user can't be determined (deletes, a lost resume token).
+# Reconnects with backoff and resumes from the last seen change, so a dropped connection
+# loses nothing; only a resume token the server rejects is reported as "anything changed".
+# Change events are projected down to the userId and the update description, so the
+# history arrays never cross the wire; subscribe_changes() hands the event itself over
+# (an append reports just the new elements) for subscribers that apply changes incrementally.
+
+import os
+import threading
+import time
+from pymongo.errors import OperationFailure, PyMongoError
+from utils.logger import logger
+
+# Server error codes meaning change streams are not available on this deployment
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40324}
+
+
+class UserChangeListener:
+    def __init__(self, get_db, collections, max_backoff=60.0):
+        """
+        get_db: callable returning the pymongo database holding the collections
+        collections: names of the collections whose changes should be reported
+        """
+        self.get_db = get_db
+        self.collections = list(collections)
+        self.max_backoff = max_backoff
+        self._subscribers = []
+        self._thread = None
+        self._pid = None
+        self._resume_token = None
+        self.events = 0
+        self.enabled = True
+
+    def subscribe(self, callback, collections=None):
+        """
+        Call callback(user_id) on changes to the given collections (default: all watched ones).
+        A None user_id ("anything may have changed") reaches every subscriber.
+        """
+        self._subscribers.append((callback, set(collections) if collections is not None else None, False))
+
+    def subscribe_changes(self, callback, collections=None):
+        """Like subscribe, but callback(change) gets the projected change event, or None when anything may have changed."""
+        self._subscribers.append((callback, set(collections) if collections is not None else None, True))
+
+    def _notify(self, user_id, collection=None, change=None):
+        self.events += 1
+        for callback, collections, wants_change in self._subscribers:
+            if collection is not None and collections is not None and collection not in collections:
+                continue
+            try:
+                callback(change if wants_change else user_id)
+            except Exception as e:
+                logger.error("User change subscriber failed: %s", e)
+
+    @property
+    def running(self):
+        """Whether changes are currently being watched in this process."""
+        return self.enabled and self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start watching in the background (again in a forked child)."""
+        if not self.enabled or (self._thread is not None and self._pid == os.getpid()):
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="user-change-listener", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": self.collections}}},
+            # The looked-up document holds the user's whole history; only its userId is needed
+            # (appends still come through: updateDescription holds only the new elements)
+            {"$project": {"fullDocument.userId": 1, "operationType": 1, "ns": 1, "updateDescription": 1}},
+        ]
+        backoff = 1.0
+        while True:
+            try:
+                with self.get_db().watch(pipeline, full_document="updateLookup",
+                                         resume_after=self._resume_token) as stream:
+                    backoff = 1.0
+                    # The opening batch carries a resume point even before the first change
+                    self._resume_token = stream.resume_token or self._resume_token
+                    for change in stream:
+                        self._resume_token = stream.resume_token
+                        user_id = (change.get("fullDocument") or {}).get("userId")
+                        self._notify(str(user_id) if user_id is not None else None,
+                                     (change.get("ns") or {}).get("coll"), change)
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    self.enabled = False
+                    logger.warn("Change streams are not supported here, relying on cache TTL only: %s", e)
+                    return
+                # The resume point may be gone; anything could have changed meanwhile
+                logger.error("User change stream failed: %s", e)
+                if self._resume_token is not None:
+                    self._resume_token = None
+                    self._notify(None)
+            except PyMongoError as e:
+                # Resuming from the kept token replays whatever changed while disconnected
+                logger.error("User change stream disconnected, resuming: %s", e)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,97 @@
+# Purpose: Load the stress training set from MongoDB straight into NumPy arrays.
+# Features:
+# Server-side projection of only the model columns.
+# Streams the cursor in batch_size chunks into preallocated float arrays,
+# so no list of full documents or DataFrame is ever built.
+
+import os
+from collections import namedtuple
+import numpy as np
+
+# Model input columns, in the order the model is trained and served with
+FEATURE_COLUMNS = [
+    'snoring_range', 'respiration_rate', 'body_temperature',
+    'limb_movement', 'blood_oxygen', 'heart_rate',
+    'sleep_duration', 'age', 'weight'
+]
+TARGET_COLUMN = 'stress_level'
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("TRAINING_LOAD_BATCH_SIZE", 10000))
+
+# X: float64 (n_rows, n_features), y: int64 (n_rows,), last_id: largest _id seen (None unless with_ids)
+TrainingData = namedtuple("TrainingData", "X y last_id")
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _rows_to_array(rows):
+    try:
+        return np.array(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Some document holds a null or a non-numeric value; treat it as missing
+        return np.array([[_to_float(v) for v in row] for row in rows], dtype=np.float64)
+
+
+def load_training_arrays(collection, query=None, batch_size=DEFAULT_BATCH_SIZE, sort=None,
+                         limit=0, with_ids=False):
+    """
+    Stream (query-matching) training documents into NumPy arrays.
+
+    Rows without a usable stress_level are skipped. Set with_ids to also track
+    the largest _id read, which callers use as a sync / training watermark.
+    """
+    query = query or {}
+    columns = FEATURE_COLUMNS + [TARGET_COLUMN]
+    projection = {column: 1 for column in columns}
+    if not with_ids:
+        projection['_id'] = 0
+
+    # Size the arrays up front; they grow if documents arrive while we stream
+    if limit:
+        capacity = limit
+    else:
+        capacity = collection.count_documents(query) if query else collection.estimated_document_count()
+    capacity = max(capacity, 1)
+    data = np.empty((capacity, len(columns)), dtype=np.float64)
+
+    cursor = collection.find(query, projection, sort=sort, limit=limit, batch_size=batch_size)
+    n_rows = 0
+    last_id = None
+    chunk = []
+
+    def flush(chunk, data, n_rows):
+        block = _rows_to_array(chunk)
+        if n_rows + len(block) > len(data):
+            grown = np.empty((max(len(data) * 2, n_rows + len(block)), len(columns)), dtype=np.float64)
+            grown[:n_rows] = data[:n_rows]
+            data = grown
+        data[n_rows:n_rows + len(block)] = block
+        return data, n_rows + len(block)
+
+    for document in cursor:
+        chunk.append([document.get(column, np.nan) for column in columns])
+        if with_ids:
+            document_id = document['_id']
+            if last_id is None or document_id > last_id:
+                last_id = document_id
+        if len(chunk) >= batch_size:
+            data, n_rows = flush(chunk, data, n_rows)
+            chunk = []
+    if chunk:
+        data, n_rows = flush(chunk, data, n_rows)
+
+    data = data[:n_rows]
+    target = data[:, -1]
+    labelled = ~np.isnan(target)
+    if not labelled.all():
+        data = data[labelled]
+        target = data[:, -1]
+
+    X = data[:, :-1]
+    y = target.astype(np.int64)
+    return TrainingData(X, y, last_id)
@@ -0,0 +1,129 @@
+# Purpose: Move collected predictions from the temp collection into the main dataset.
+# Features:
+# Only documents up to a snapshot watermark (the largest _id when the run starts) are moved,
+# so predictions written during the migration wait for the next run.
+# Documents are copied in _id order, chunk by chunk, with unordered ReplaceOne upserts and
+# then deleted from the temp collection, so a retried chunk never duplicates data.
+# A checkpoint document in migration_state records progress and lets an interrupted run resume.
+# A lease in the same document keeps two processes from migrating at once.
+
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from utils.logger import logger
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("ADDDATA_BATCH_SIZE", 1000))
+LEASE_SECONDS = float(os.environ.get("MIGRATION_LEASE_SECONDS", 300))
+STATE_COLLECTION = "migration_state"
+
+
+class MigrationLocked(Exception):
+    """Another migration holds the lease."""
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class TempToMainMigration:
+    def __init__(self, db, source="stress_data_set_temp", target="stress_data_set",
+                 batch_size=DEFAULT_BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+        self.db = db
+        self.source = db[source]
+        self.target = db[target]
+        self.state = db[STATE_COLLECTION]
+        self.state_id = f"{source}->{target}"
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def status(self):
+        """The checkpoint document of the last (or current) run, or None if there hasn't been one."""
+        return self.state.find_one({"_id": self.state_id})
+
+    def acquire(self):
+        """Take the lease, or raise MigrationLocked if a live run holds it."""
+        now = _now()
+        try:
+            self.state.find_one_and_update(
+                # lease_until: None also matches a missing field
+                {"_id": self.state_id, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The state document exists but its lease is still held
+            raise MigrationLocked("A data migration is already running")
+
+    def release(self):
+        self.state.update_one({"_id": self.state_id, "owner": self.owner}, {"$set": {"lease_until": None}})
+
+    def _checkpoint(self, fields):
+        fields = dict(fields, lease_until=_now() + timedelta(seconds=self.lease_seconds), updated_at=_now())
+        result = self.state.update_one({"_id": self.state_id, "owner": self.owner}, {"$set": fields})
+        if result.matched_count == 0:
+            raise MigrationLocked("Lost the migration lease")
+
+    def _start_or_resume(self):
+        state = self.status() or {}
+        if state.get("status") in ("running", "failed") and state.get("watermark") is not None:
+            logger.info("Resuming data migration from %s up to %s", state.get('last_id'), state['watermark'])
+            return state
+
+        newest = self.source.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        watermark = newest["_id"] if newest else None
+        total = self.source.count_documents({"_id": {"$lte": watermark}}) if watermark is not None else 0
+        state = {
+            "status": "running", "watermark": watermark, "last_id": None, "total": total,
+            "moved": 0, "chunks": 0, "elapsed_seconds": 0.0, "started_at": _now(),
+            "finished_at": None, "error": None,
+        }
+        self._checkpoint(state)
+        return state
+
+    def run(self):
+        """Move every document up to the watermark. The caller must hold the lease."""
+        state = self._start_or_resume()
+        watermark = state["watermark"]
+        moved, chunks = state.get("moved", 0), state.get("chunks", 0)
+        elapsed = state.get("elapsed_seconds", 0.0)
+        last_id = state.get("last_id")
+        self._checkpoint({"status": "running", "error": None})
+
+        started = time.perf_counter()
+        try:
+            while watermark is not None:
+                id_range = {"$lte": watermark}
+                if last_id is not None:
+                    id_range["$gt"] = last_id
+                chunk = list(self.source.find({"_id": id_range}).sort("_id", 1).limit(self.batch_size))
+                if not chunk:
+                    break
+
+                # Upserts by _id make a retried chunk overwrite instead of duplicating
+                self.target.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in chunk],
+                                       ordered=False)
+                ids = [doc["_id"] for doc in chunk]
+                self.source.delete_many({"_id": {"$in": ids}})
+
+                last_id = ids[-1]
+                moved += len(chunk)
+                chunks += 1
+                run_seconds = elapsed + time.perf_counter() - started
+                self._checkpoint({"last_id": last_id, "moved": moved, "chunks": chunks,
+                                  "elapsed_seconds": run_seconds,
+                                  "docs_per_second": moved / run_seconds if run_seconds else None})
+                logger.info("Moved %s/%s documents", moved, state.get('total', 0))
+        except Exception as e:
+            self._checkpoint({"status": "failed", "error": str(e),
+                              "elapsed_seconds": elapsed + time.perf_counter() - started})
+            raise
+
+        run_seconds = elapsed + time.perf_counter() - started
+        self._checkpoint({"status": "completed", "finished_at": _now(), "elapsed_seconds": run_seconds,
+                          "docs_per_second": moved / run_seconds if run_seconds else None})
+        return self.status()
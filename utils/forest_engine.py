@@ -0,0 +1,156 @@
+# Purpose: Fast inference for the stress level random forest.
+# Features:
+# Compiles a fitted sklearn RandomForestClassifier into flat NumPy arrays.
+# Evaluates single rows and batches without sklearn's validation and per-tree dispatch.
+# Predictions match RandomForestClassifier.predict exactly.
+
+import json
+import os
+import numpy as np
+
+# sklearn marks leaves with -1 children (TREE_LEAF)
+TREE_LEAF = -1
+
+# Rows evaluated together by predict_proba
+CHUNK_ROWS = 4096
+
+ARRAY_NAMES = ["feature", "threshold", "left", "right", "missing_left", "values", "roots", "classes"]
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, missing_left, values, roots, classes,
+                 n_features, max_depth):
+        """
+        All trees are stored in one set of arrays indexed by a global node id:
+          feature, threshold: split of each node (leaves split on feature 0 and point at themselves)
+          left, right: global ids of the children
+          missing_left: whether NaN goes to the left child
+          values: normalized class probabilities of each node, shape (n_nodes, n_classes)
+          roots: global id of every tree's root node
+          classes: class labels, same as model.classes_
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.values = values
+        self.roots = roots
+        self.classes = classes
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a fitted RandomForestClassifier."""
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+
+        n_classes = int(model.n_classes_)
+        features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == TREE_LEAF
+
+            # Leaves loop back onto themselves so every row can take max_depth steps
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            missing_left = getattr(tree, "missing_go_to_left", None)
+            missing_lefts.append(np.zeros(n_nodes, dtype=bool) if missing_left is None
+                                 else np.asarray(missing_left, dtype=bool))
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            missing_left=np.ascontiguousarray(np.concatenate(missing_lefts)),
+            values=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+            n_features=model.n_features_in_,
+            max_depth=max_depth,
+        )
+
+    def _check_input(self, X):
+        # sklearn evaluates trees on float32 input, so do the same to get identical splits
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input with {self.n_features} features, got shape {X.shape}")
+        if np.isinf(X).any():
+            raise ValueError("Input contains infinity or a value too large for dtype('float32').")
+        return X
+
+    def apply(self, X):
+        """Return the global leaf id reached in every tree, shape (n_trees, n_samples)."""
+        X = self._check_input(X)
+        has_nan = np.isnan(X).any()
+        rows = np.arange(X.shape[0])[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = x <= self.threshold[nodes]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        X = self._check_input(X)
+        proba = np.zeros((X.shape[0], self.values.shape[1]), dtype=np.float64)
+        # Row blocks bound the (n_trees, rows) temporaries of apply for large batches
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            block = proba[start:start + CHUNK_ROWS]
+            # Accumulate tree by tree in the same order as sklearn so ties resolve identically
+            for leaves in self.apply(X[start:start + CHUNK_ROWS]):
+                block += self.values[leaves]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def predict_one(self, row):
+        """Predict the class of a single feature row."""
+        return self.predict(row)[0]
+
+    def save(self, path):
+        """Write the arrays as .npy files (memory-mappable) plus a small metadata file."""
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name), allow_pickle=False)
+        with open(os.path.join(path, "forest.json"), "w") as f:
+            json.dump({"n_features": self.n_features, "max_depth": self.max_depth}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load a forest written by save(); pass mmap_mode='r' to share pages between processes."""
+        with open(os.path.join(path, "forest.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in ARRAY_NAMES
+        }
+        return cls(n_features=meta["n_features"], max_depth=meta["max_depth"], **arrays)
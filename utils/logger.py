@@ -1,30 +1,166 @@
 # Purpose: Logs application events (e.g., errors, requests).
 # Features:
-# Logs to console with different log levels.
-# Supports levels like info, warn, error, and debug.
+# Supports levels like info, warn, error, and debug, with lazy %-style arguments:
+# logger.debug("scored %s rows", n) only formats when debug is enabled.
+# Records go through a bounded queue to a background writer thread, so formatting and
+# console I/O never run on the request thread; records are dropped (and counted) if it backs up.
+# JSON lines by default (LOG_FORMAT=text for the old plain format).
+# Levels per module: LOG_LEVEL=INFO plus LOG_LEVELS="controller.reccomdationcontroller=DEBUG,...".
+# Sampling of info/debug records per route: LOG_SAMPLE_RATES="/predict_stress_level=0.01".
+# The decision is made once per request, so a sampled request keeps all its records;
+# warnings and errors are always kept.
 
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+try:
+    from flask import g, has_request_context, request
+except ImportError:  # logging also works outside the web app
+    has_request_context = lambda: False
+
+
+def _parse_mapping(value):
+    mapping = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        key, _, setting = item.rpartition("=")
+        if key:
+            mapping[key.strip()] = setting.strip()
+    return mapping
+
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = {module: level.upper() for module, level in _parse_mapping(os.environ.get("LOG_LEVELS", "")).items()}
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_RATES = {route: float(rate) for route, rate in _parse_mapping(os.environ.get("LOG_SAMPLE_RATES", "")).items()}
+
+ROOT_NAME = "app"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        route = getattr(record, "route", None)
+        if route is not None:
+            entry["route"] = route
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Hand the record over unformatted; the writer thread formats it
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
 class Logger:
     def __init__(self):
-        # Configure the logger
-        logging.basicConfig(
-            format="[%(levelname)s]: %(message)s",
-            level=logging.DEBUG  # Set default log level
-        )
-        self.logger = logging.getLogger("custom_logger")
+        self.root = logging.getLogger(ROOT_NAME)
+        self.root.setLevel(LOG_LEVEL)
+        self.root.propagate = False
+        for module, level in LOG_LEVELS.items():
+            logging.getLogger(f"{ROOT_NAME}.{module}").setLevel(level)
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter("[%(levelname)s]: %(message)s"))
+        self._stream = stream
+        self._handler = None
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._loggers = {}
+        self._start()
+        atexit.register(self.stop)
+
+    def _start(self):
+        # The writer thread doesn't survive fork, so a forked child starts its own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._handler is not None:
+                self.root.removeHandler(self._handler)
+            log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            self._handler = _NonBlockingQueueHandler(log_queue)
+            self.root.addHandler(self._handler)
+            self._listener = logging.handlers.QueueListener(log_queue, self._stream, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Flush queued records (run at exit)."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+    def _logger_for(self, module):
+        log = self._loggers.get(module)
+        if log is None:
+            log = self._loggers[module] = logging.getLogger(f"{ROOT_NAME}.{module}")
+        return log
+
+    def _log(self, level, message, args, exc_info=None):
+        if self._pid != os.getpid():
+            self._start()
+        # Name the logger after the calling module so levels can be set per module
+        log = self._logger_for(sys._getframe(2).f_globals.get("__name__", "app"))
+        if not log.isEnabledFor(level):
+            return
+        route = None
+        if has_request_context():
+            rule = request.url_rule
+            route = rule.rule if rule is not None else None
+            if level < logging.WARNING and not self._sampled(route):
+                return
+        log.log(level, message, *args, exc_info=exc_info, extra={"route": route})
+
+    def _sampled(self, route):
+        rate = LOG_SAMPLE_RATES.get(route)
+        if rate is None or rate >= 1.0:
+            return True
+        sampled = getattr(g, "log_sampled", None)
+        if sampled is None:
+            sampled = g.log_sampled = random.random() < rate
+        return sampled
+
+    def info(self, message, *args):
+        self._log(logging.INFO, message, args)
 
-    def info(self, message):
-        self.logger.info(message)
+    def warn(self, message, *args):
+        self._log(logging.WARNING, message, args)
 
-    def warn(self, message):
-        self.logger.warning(message)
+    def error(self, message, *args, exc_info=None):
+        self._log(logging.ERROR, message, args, exc_info)
 
-    def error(self, message):
-        self.logger.error(message)
+    def debug(self, message, *args):
+        self._log(logging.DEBUG, message, args)
 
-    def debug(self, message):
-        self.logger.debug(message)
+    def stats(self):
+        return {"queued": self._handler.queue.qsize(), "dropped": self._handler.dropped}
 
 # Create a single instance of the logger
 logger = Logger()
@@ -0,0 +1,186 @@
+# Purpose: Per-request and per-stage latency metrics in Prometheus text format.
+# Features:
+# Flask middleware times every request by route pattern, method and status.
+# span("stage") times a stage (parse, validate, predict, db_read, db_write, scoring,
+# serialize) inside the current request.
+# Fixed-bucket histograms and counters kept in process memory; recording is a bisect
+# and a few additions under one lock, cheap enough to leave on in production.
+# Metrics are per process: with several gunicorn workers each scrape sees one worker.
+# Optional Server-Timing response header with the request's stages.
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "0") == "1"
+
+# Upper bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+def _labels(names, values):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (route, method, status) -> Histogram
+        self.stages = {}  # (route, stage) -> Histogram
+        self.errors = {}  # (route, stage) -> count of spans that raised
+        self.in_flight = 0
+
+    def observe_request(self, route, method, status, seconds):
+        with self._lock:
+            key = (route, method, status)
+            histogram = self.requests.get(key)
+            if histogram is None:
+                histogram = self.requests[key] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_stage(self, route, stage, seconds, failed=False):
+        with self._lock:
+            key = (route, stage)
+            histogram = self.stages.get(key)
+            if histogram is None:
+                histogram = self.stages[key] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def _render_histograms(self, lines, name, help_text, label_names, histograms):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(histograms.items()):
+            labels = _labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            # Copy under the lock, format outside it
+            requests = {key: _copy(h) for key, h in self.requests.items()}
+            stages = {key: _copy(h) for key, h in self.stages.items()}
+            errors = dict(self.errors)
+            in_flight = self.in_flight
+
+        lines = []
+        self._render_histograms(lines, "http_request_duration_seconds", "Request latency by route.",
+                                ("route", "method", "status"), requests)
+        lines.append("# HELP http_requests_total Requests handled by route.")
+        lines.append("# TYPE http_requests_total counter")
+        for key, histogram in sorted(requests.items()):
+            lines.append(f"http_requests_total{{{_labels(('route', 'method', 'status'), key)}}} {histogram.count}")
+        self._render_histograms(lines, "request_stage_duration_seconds", "Time spent in each stage of a request.",
+                                ("route", "stage"), stages)
+        lines.append("# HELP request_stage_errors_total Stages that raised an exception.")
+        lines.append("# TYPE request_stage_errors_total counter")
+        for key, count in sorted(errors.items()):
+            lines.append(f"request_stage_errors_total{{{_labels(('route', 'stage'), key)}}} {count}")
+        lines.append("# HELP http_requests_in_flight Requests currently being handled.")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append(f"http_requests_in_flight {in_flight}")
+        lines.append("# HELP process_pid Process the metrics come from.")
+        lines.append("# TYPE process_pid gauge")
+        lines.append(f"process_pid {os.getpid()}")
+        return "\n".join(lines) + "\n"
+
+
+def _copy(histogram):
+    copy = Histogram()
+    copy.counts = list(histogram.counts)
+    copy.total = histogram.total
+    copy.count = histogram.count
+    return copy
+
+
+metrics = MetricsRegistry()
+
+
+def _route():
+    rule = request.url_rule
+    # The route pattern keeps ids out of the labels
+    return rule.rule if rule is not None else "unmatched"
+
+
+@contextmanager
+def span(stage):
+    """Time a stage of the current request (or of background work outside a request)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if has_request_context():
+            metrics.observe_stage(_route(), stage, elapsed, failed)
+            spans = getattr(g, "metric_spans", None)
+            if spans is not None:
+                spans.append((stage, elapsed))
+        else:
+            metrics.observe_stage("background", stage, elapsed, failed)
+
+
+def _before_request():
+    g.metric_started = time.perf_counter()
+    g.metric_spans = []
+    with metrics._lock:
+        metrics.in_flight += 1
+
+
+def _after_request(response):
+    started = getattr(g, "metric_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    metrics.observe_request(_route(), request.method, response.status_code, elapsed)
+    if SERVER_TIMING:
+        entries = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in g.metric_spans]
+        entries.append(f"total;dur={elapsed * 1000:.3f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+def _teardown_request(exc):
+    if getattr(g, "metric_started", None) is not None:
+        with metrics._lock:
+            metrics.in_flight -= 1
+
+
+def init_app(app):
+    """Time every request of app (no-op when METRICS_ENABLED=0)."""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,185 @@
+# Purpose: Coalesce concurrent single-row predictions into vectorized batches.
+# Features:
+# Request threads enqueue one feature row each and block until their own result is ready.
+# A scheduler thread gathers rows for up to a short window or a maximum batch size,
+# scores them with one predict call and hands each caller its prediction.
+# Routes mark requests that are about to submit (expecting()), and a forming batch waits
+# out the window only while such requests are still on their way, so a lone request is
+# scored immediately and light traffic pays no batching delay.
+# Batch-size histogram and queue-wait metrics.
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+from utils.logger import logger
+
+BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 2))
+MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH", 64))
+RESULT_TIMEOUT_SECONDS = float(os.environ.get("PREDICT_BATCH_TIMEOUT_SECONDS", 5))
+
+
+class _Slot:
+    __slots__ = ("row", "enqueued", "event", "result", "error")
+
+    def __init__(self, row):
+        self.row = row
+        self.enqueued = time.perf_counter()
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    def __init__(self, predict, n_features, window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE,
+                 result_timeout=RESULT_TIMEOUT_SECONDS, wait_window=1000):
+        """
+        predict: callable taking a (n, n_features) float32 array and returning n predictions
+        window_ms: how long to keep gathering rows once a batch has started
+        max_batch_size: a batch is scored as soon as it holds this many rows
+        """
+        self.predict = predict
+        self.n_features = n_features
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.result_timeout = result_timeout
+        self.queue = queue.Queue()
+        self._pending = 0  # submitted rows the scheduler has not answered yet
+        self._expected = 0  # requests inside expecting(), whether or not they have submitted yet
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        # Metrics
+        self._waits_ms = deque(maxlen=wait_window)
+        self.batch_sizes = {}  # power-of-two upper bound -> number of batches
+        self.batches = 0
+        self.predictions = 0
+        self.failed_batches = 0
+        self.max_wait_ms = 0.0
+
+    def _ensure_started(self):
+        # Start the scheduler lazily, and again in a forked child where the thread does not exist
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Requests queued in the parent are not ours to answer
+                self.queue = queue.Queue()
+                self._pending = 0
+                self._expected = 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="predict-micro-batcher", daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def expecting(self):
+        """
+        Mark a request that will submit a row, from before it parses its input until it
+        responds, so a batch that is forming meanwhile waits for it. Usable as a decorator.
+        """
+        with self._lock:
+            self._expected += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._expected -= 1
+
+    def submit(self, row):
+        """Predict one feature row, sharing a vectorized call with concurrent requests."""
+        # Validate here (float32, like the engine) so one bad row can't fail everyone else's batch
+        row = np.asarray(row, dtype=np.float32).reshape(-1)
+        if row.shape[0] != self.n_features:
+            raise ValueError(f"Expected input with {self.n_features} features, got shape {(1,) + row.shape}")
+        if np.isinf(row).any():
+            raise ValueError("Input contains infinity or a value too large for dtype('float32').")
+        self._ensure_started()
+        slot = _Slot(row)
+        # Counted before it is queued, so the scheduler never sees a row it doesn't know is coming
+        with self._lock:
+            self._pending += 1
+        self.queue.put(slot)
+        if not slot.event.wait(self.result_timeout):
+            raise TimeoutError("Timed out waiting for a batched prediction")
+        if slot.error is not None:
+            raise slot.error
+        return slot.result
+
+    def _gather(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            # Wait only while some request that hasn't been gathered yet is on its way
+            with self._lock:
+                others_in_flight = max(self._pending, self._expected) > len(batch)
+            remaining = deadline - time.perf_counter()
+            if not others_in_flight or remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._gather()
+            started = time.perf_counter()
+            try:
+                predictions = self.predict(np.vstack([slot.row for slot in batch]))
+                for slot, prediction in zip(batch, predictions):
+                    slot.result = prediction
+            except Exception as e:
+                logger.error("Batched prediction of %s rows failed: %s", len(batch), e)
+                self.failed_batches += 1
+                for slot in batch:
+                    slot.error = e
+            # Released here rather than by the callers, whose threads may not be scheduled for a while
+            with self._lock:
+                self._pending -= len(batch)
+            for slot in batch:
+                slot.event.set()
+            self._record(batch, started)
+
+    def _record(self, batch, started):
+        bucket = 1
+        while bucket < len(batch):
+            bucket *= 2
+        with self._lock:
+            self.batches += 1
+            self.predictions += len(batch)
+            self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+            for slot in batch:
+                wait_ms = (started - slot.enqueued) * 1000
+                self._waits_ms.append(wait_ms)
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            percentile = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else None
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "in_flight": self._pending,
+                "expected": self._expected,
+                "batches": self.batches,
+                "predictions": self.predictions,
+                "failed_batches": self.failed_batches,
+                "mean_batch_size": self.predictions / self.batches if self.batches else None,
+                # Keys are upper bounds: "4" counts batches of 3 or 4 rows
+                "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "queue_wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+                                  "max": round(self.max_wait_ms, 3)},
+            }
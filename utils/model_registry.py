@@ -0,0 +1,268 @@
+# Purpose: Versioned storage and hot reload of the stress level model.
+# Features:
+# Every trained model is published into its own directory under models/versions/
+# with a manifest holding its sha256 checksum and training metadata.
+# models/CURRENT points at the active version and is updated atomically.
+# Each version also stores its FlatForest arrays, so serving loads them without
+# unpickling the sklearn model (and without importing sklearn at all).
+# ModelHolder loads new versions in the background, warms them and swaps them in
+# without blocking predictions that are already running.
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+import numpy as np
+from utils.forest_engine import FlatForest
+from utils.logger import logger
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+MODEL_FILE = "random_forest.pkl"
+MANIFEST_FILE = "manifest.json"
+ENGINE_DIR = "forest"
+POINTER_FILE = "CURRENT"
+# Version name used for a pre-registry models/random_forest.pkl
+LEGACY_VERSION = "legacy"
+
+LoadedModel = namedtuple("LoadedModel", "version model engine checksum created_at loaded_at load_seconds")
+
+
+def _fsync_write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _file_checksums(directory):
+    checksums = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as f:
+            checksums[name] = hashlib.sha256(f.read()).hexdigest()
+    return checksums
+
+
+class ModelRegistry:
+    def __init__(self, root=MODEL_DIR, keep_versions=5):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.pointer_path = os.path.join(root, POINTER_FILE)
+        self.keep_versions = keep_versions
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(version) whenever a new version is published or reported via notify_published."""
+        self._listeners.append(callback)
+
+    def publish(self, model, metadata=None):
+        """Save a model as a new version and make it the active one. Returns its manifest."""
+        version = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+        # Write everything into a temp directory first so readers never see a partial version
+        staging = os.path.join(self.versions_dir, f".staging-{version}")
+        os.makedirs(staging)
+        import joblib  # only needed by training, keep it off the serving import path
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        payload = buffer.getvalue()
+        _fsync_write(os.path.join(staging, MODEL_FILE), payload)
+        engine_dir = os.path.join(staging, ENGINE_DIR)
+        FlatForest.from_sklearn(model).save(engine_dir)
+
+        manifest = {
+            "version": version,
+            "checksum": hashlib.sha256(payload).hexdigest(),
+            "size_bytes": len(payload),
+            "engine_checksums": _file_checksums(engine_dir),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "metadata": metadata or {},
+        }
+        _fsync_write(os.path.join(staging, MANIFEST_FILE), json.dumps(manifest, indent=2).encode())
+        os.rename(staging, os.path.join(self.versions_dir, version))
+
+        self._write_pointer(version)
+        logger.info("Published model version %s", version)
+        self._prune()
+        self.notify_published(version)
+        return manifest
+
+    def notify_published(self, version):
+        """Run the publish listeners, e.g. after another process published a version."""
+        for callback in self._listeners:
+            try:
+                callback(version)
+            except Exception as e:
+                logger.error("Model publish listener failed: %s", e)
+
+    def _write_pointer(self, version):
+        # os.replace is atomic, so readers see either the old or the new version name
+        temp_path = f"{self.pointer_path}.{uuid.uuid4().hex}.tmp"
+        _fsync_write(temp_path, version.encode())
+        os.replace(temp_path, self.pointer_path)
+
+    def current_version(self):
+        """Name of the active version, or None if no model has been published."""
+        try:
+            with open(self.pointer_path) as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except FileNotFoundError:
+            pass
+        if os.path.exists(os.path.join(self.root, MODEL_FILE)):
+            return LEGACY_VERSION
+        return None
+
+    def versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(name for name in os.listdir(self.versions_dir) if not name.startswith("."))
+
+    def manifest(self, version):
+        if version == LEGACY_VERSION:
+            return {"version": LEGACY_VERSION, "checksum": None, "created_at": None, "metadata": {}}
+        with open(os.path.join(self.versions_dir, version, MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    def model_path(self, version):
+        if version == LEGACY_VERSION:
+            return os.path.join(self.root, MODEL_FILE)
+        return os.path.join(self.versions_dir, version, MODEL_FILE)
+
+    def load(self, version):
+        """Load a version after verifying its checksum. Returns (model, manifest)."""
+        manifest = self.manifest(version)
+        with open(self.model_path(version), "rb") as f:
+            payload = f.read()
+        checksum = hashlib.sha256(payload).hexdigest()
+        if manifest["checksum"] is None:
+            manifest["checksum"] = checksum
+        elif checksum != manifest["checksum"]:
+            raise ValueError(f"Checksum mismatch for model version {version}")
+        import joblib
+        return joblib.load(io.BytesIO(payload)), manifest
+
+    def load_engine(self, version, mmap_mode=None):
+        """
+        Load a version's FlatForest after verifying its checksums. Returns (engine, model, manifest);
+        model is None unless the version predates stored engines and had to be unpickled.
+        """
+        manifest = self.manifest(version)
+        engine_dir = os.path.join(self.versions_dir, version, ENGINE_DIR)
+        expected = manifest.get("engine_checksums")
+        if not expected or not os.path.isdir(engine_dir):
+            model, manifest = self.load(version)
+            return FlatForest.from_sklearn(model), model, manifest
+        if _file_checksums(engine_dir) != expected:
+            raise ValueError(f"Checksum mismatch for model version {version} engine")
+        return FlatForest.load(engine_dir, mmap_mode=mmap_mode), None, manifest
+
+    def _prune(self):
+        # Keep the newest versions (and always the active one)
+        current = self.current_version()
+        stale = [v for v in self.versions()[:-self.keep_versions] if v != current]
+        for version in stale:
+            shutil.rmtree(os.path.join(self.versions_dir, version), ignore_errors=True)
+
+
+class ModelHolder:
+    def __init__(self, registry, poll_interval=5.0, mmap_mode=None):
+        """mmap_mode='r' memory-maps the engine arrays so worker processes share one copy in the page cache."""
+        self.registry = registry
+        self.poll_interval = poll_interval
+        self.mmap_mode = mmap_mode
+        self._active = None
+        self._load_lock = threading.Lock()
+        self._failed_version = None
+        self._watcher = None
+        self._watcher_pid = None
+        registry.add_listener(lambda version: self.refresh())
+
+    def current(self):
+        """
+        The active LoadedModel, or None before the first version is published.
+        Callers keep using the instance they got even if a swap happens.
+        """
+        return self._active
+
+    def _load(self, version):
+        started = time.perf_counter()
+        engine, model, manifest = self.registry.load_engine(version, mmap_mode=self.mmap_mode)
+        # Warm up the new engine before it takes traffic
+        engine.predict(np.zeros((1, engine.n_features)))
+        return LoadedModel(
+            version=version,
+            model=model,
+            engine=engine,
+            checksum=manifest["checksum"],
+            created_at=manifest["created_at"],
+            loaded_at=datetime.now(timezone.utc).isoformat(),
+            load_seconds=time.perf_counter() - started,
+        )
+
+    def load_initial(self):
+        """
+        Load the active version synchronously (used at startup). Returns None when no version
+        has been published yet; the holder then stays empty until the watcher finds the first one.
+        """
+        version = self.registry.current_version()
+        if version is None:
+            logger.warn("No trained model found in %s; predictions are unavailable until one is published",
+                        self.registry.root)
+            return None
+        self._active = self._load(version)
+        logger.info("Loaded model version %s in %.3fs", version, self._active.load_seconds)
+        return self._active
+
+    def check_for_update(self):
+        """Load and swap in the active version if it changed. Runs on the calling thread."""
+        version = self.registry.current_version()
+        active = self._active
+        if version is None or version == self._failed_version or (active and active.version == version):
+            return False
+        # Only one loader at a time; a concurrent check simply skips
+        if not self._load_lock.acquire(blocking=False):
+            return False
+        try:
+            loaded = self._load(version)
+        except Exception as e:
+            self._failed_version = version
+            logger.error("Failed to load model version %s, keeping current model: %s", version, e)
+            return False
+        finally:
+            self._load_lock.release()
+        # Rebinding one attribute is atomic, so in-flight predictions are never stalled
+        self._active = loaded
+        logger.info("Swapped in model version %s (loaded in %.3fs)", version, loaded.load_seconds)
+        return True
+
+    def refresh(self):
+        """Check for a new version on a background thread."""
+        threading.Thread(target=self.check_for_update, name="model-reload", daemon=True).start()
+
+    def start_watcher(self):
+        """Poll the registry pointer so versions published by other processes are picked up."""
+        if self.poll_interval <= 0 or (self._watcher is not None and self._watcher_pid == os.getpid()):
+            return
+        self._watcher_pid = os.getpid()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check_for_update()
+            except Exception as e:
+                logger.error("Model watcher error: %s", e)
+
+
+# Shared registry for the process, so publishing from training notifies the serving holder
+registry = ModelRegistry(keep_versions=int(os.environ.get("MODEL_KEEP_VERSIONS", 5)))
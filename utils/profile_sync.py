@@ -0,0 +1,351 @@
+# Purpose: Materialized per-user profile summaries for recommendations.
+# Features:
+# One small document per user in test.user_profiles holding the parameter count,
+# the latest parameter entry and a compact matrix of past recommendations.
+# A background worker keeps the profiles current, so the recommendation hot path reads
+# one document instead of the full history arrays. Entries appended to a user's history
+# are applied from the change event alone ($inc / $push with $slice), guarded by the
+# entry counts stored in the profile; anything else (edits, removals, inserts, a count
+# that doesn't line up) falls back to rebuilding that user's profile from their history.
+# Every web worker sees the change events, but only the holder of a lease in
+# test.profile_sync_state applies them, so each change is processed once; a process
+# taking the lease over from another resyncs every profile, as changes may have been missed.
+
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from utils.logger import logger
+from utils.recommendation_scoring import build_parameter_matrix, latest_entry
+
+PROFILE_COLLECTION = "user_profiles"
+# Only the most recent recommendations are kept so profiles stay well below the BSON size limit
+MAX_PROFILE_RECOMMENDATIONS = int(os.environ.get("PROFILE_MAX_RECOMMENDATIONS", 20000))
+# History collection -> the array field holding its entries
+HISTORY_FIELDS = {"userparameters": "parameters", "userrecommendations": "recommendations"}
+STATE_COLLECTION = "profile_sync_state"
+STATE_ID = "profile_sync"
+LEASE_SECONDS = float(os.environ.get("PROFILE_SYNC_LEASE_SECONDS", 60))
+
+
+def appended_entries(change):
+    """
+    (field, first_index, entries) when a change event only appended entries to a history
+    array, or None when it did anything else (inserts, replaces, edits, removals).
+    """
+    field = HISTORY_FIELDS.get((change.get("ns") or {}).get("coll"))
+    description = change.get("updateDescription")
+    if field is None or change.get("operationType") != "update" or not description:
+        return None
+    if any(name == field or name.startswith(field + ".") for name in description.get("removedFields") or []):
+        return None
+    if any(truncated.get("field") == field for truncated in description.get("truncatedArrays") or []):
+        return None
+
+    appended = {}
+    pattern = re.compile(rf"{re.escape(field)}\.(\d+)")
+    for name, value in (description.get("updatedFields") or {}).items():
+        if name == field:
+            # The array was created (or rewritten) by this update
+            if not isinstance(value, list) or appended:
+                return None
+            appended = dict(enumerate(value))
+            continue
+        match = pattern.fullmatch(name)
+        if match is None:
+            if name.startswith(field + "."):
+                # An existing entry was edited
+                return None
+            continue
+        appended[int(match.group(1))] = value
+    if not appended:
+        return None
+    first = min(appended)
+    if sorted(appended) != list(range(first, first + len(appended))):
+        return None
+    return field, first, [appended[index] for index in range(first, first + len(appended))]
+
+
+def build_profile(user_id, parameters_doc, recommendations_doc, parameters, min_history):
+    """Summarize a user's userparameters / userrecommendations documents."""
+    entries = (parameters_doc or {}).get("parameters") or []
+    recommendations = (recommendations_doc or {}).get("recommendations") or []
+    profile = {
+        "userId": user_id,
+        "count": len(entries),
+        # Length of the source recommendations array, which incremental updates line up against
+        "recommendationCount": len(recommendations),
+        "parameterNames": parameters,
+        "latestParameters": None,
+        "recommendationMatrix": [],
+        "recommendationTexts": [],
+        "recommendationDates": [],
+        "updatedAt": datetime.now(timezone.utc),
+    }
+    # Cold users get cold-start advice, so their history isn't needed
+    if len(entries) < min_history:
+        return profile
+
+    latest = latest_entry(entries, "recordedAt")
+    if latest is not None:
+        profile["latestParameters"] = {key: latest.get(key) for key in parameters + ["recordedAt"]}
+
+    if len(recommendations) > MAX_PROFILE_RECOMMENDATIONS:
+        # Keep the most recent ones, in their stored order, so appends can $push/$slice onto the end
+        newest = sorted(
+            range(len(recommendations)), reverse=True,
+            key=lambda i: (recommendations[i].get("recommendationDate") is not None,
+                           recommendations[i].get("recommendationDate"))
+        )[:MAX_PROFILE_RECOMMENDATIONS]
+        recommendations = [recommendations[i] for i in sorted(newest)]
+    profile["recommendationMatrix"] = build_parameter_matrix(recommendations, parameters).tolist()
+    profile["recommendationTexts"] = [rec.get("recommendationText") for rec in recommendations]
+    profile["recommendationDates"] = [rec.get("recommendationDate") for rec in recommendations]
+    return profile
+
+
+class ProfileSyncer:
+    def __init__(self, get_db, parameters, min_history, on_updated=None, lease_seconds=LEASE_SECONDS):
+        """
+        get_db: callable returning the database with userparameters / userrecommendations
+        parameters: recommendation parameter names, in matrix column order
+        min_history: parameter count from which a user's history is materialized
+        on_updated: optional callback(user_id) run after a profile is rewritten
+        lease_seconds: how long the change-processing lease outlives its holder's last renewal
+        """
+        self.get_db = get_db
+        self.parameters = list(parameters)
+        self.min_history = min_history
+        self.on_updated = on_updated
+        self._pending = set()
+        # Appends to apply in arrival order: (user_id, field, first_index, entries)
+        self._appends = deque()
+        self._backfill_pending = False
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._index_ready = False
+        self.lease_seconds = lease_seconds
+        self.owner = None
+        self._owner_pid = None
+        self._leader = False
+        self._lease_checked_until = 0.0
+        self.rebuilt = 0
+        self.applied = 0
+        self.failed = 0
+        self.takeovers = 0
+
+    def get(self, user_id):
+        """The stored profile for a user, or None if it hasn't been built yet."""
+        return self.get_db()[PROFILE_COLLECTION].find_one({"userId": ObjectId(user_id)}, {"_id": 0})
+
+    def rebuild(self, user_id):
+        """Recompute and store one user's profile from their full history (backfill, resync, fallback)."""
+        db = self.get_db()
+        self._ensure_index(db)
+
+        user_oid = ObjectId(user_id)
+        entry_fields = {f"parameters.{key}": 1 for key in self.parameters + ["recordedAt"]}
+        rec_fields = {f"recommendations.{key}": 1 for key in
+                      self.parameters + ["recommendationText", "recommendationDate"]}
+        parameters_doc = db["userparameters"].find_one({"userId": user_oid}, dict(entry_fields, _id=0))
+        recommendations_doc = db["userrecommendations"].find_one({"userId": user_oid}, dict(rec_fields, _id=0))
+
+        profile = build_profile(user_oid, parameters_doc, recommendations_doc, self.parameters, self.min_history)
+        db[PROFILE_COLLECTION].replace_one({"userId": user_oid}, profile, upsert=True)
+        self.rebuilt += 1
+        if self.on_updated is not None:
+            self.on_updated(str(user_oid))
+        return profile
+
+    def _ensure_index(self, db):
+        if not self._index_ready:
+            db[PROFILE_COLLECTION].create_index("userId", unique=True)
+            self._index_ready = True
+
+    def apply_append(self, user_id, field, first_index, entries):
+        """
+        Apply entries appended to a user's history array at first_index to their profile.
+        Returns False when the profile doesn't line up with the append (missing, or built from
+        a different number of entries) and the caller should rebuild it instead.
+        """
+        db = self.get_db()
+        self._ensure_index(db)
+        profiles = db[PROFILE_COLLECTION]
+        user_oid = ObjectId(user_id)
+        count_field = "count" if field == "parameters" else "recommendationCount"
+        profile = profiles.find_one({"userId": user_oid}, {"_id": 0, "count": 1, "recommendationCount": 1,
+                                                           "latestParameters": 1})
+        if profile is None or profile.get(count_field) is None:
+            return False
+        if profile[count_field] >= first_index + len(entries):
+            # A rebuild that ran after the append already included it
+            return True
+        if profile[count_field] != first_index:
+            return False
+
+        update = {"$inc": {count_field: len(entries)}, "$set": {"updatedAt": datetime.now(timezone.utc)}}
+        warm = profile["count"] >= self.min_history
+        if field == "parameters":
+            if not warm and profile["count"] + len(entries) >= self.min_history:
+                # Turning warm needs the recommendation history materialized
+                return False
+            latest = latest_entry(entries, "recordedAt")
+            current = (profile.get("latestParameters") or {}).get("recordedAt")
+            if warm and latest is not None and (current is None or latest["recordedAt"] >= current):
+                update["$set"]["latestParameters"] = {key: latest.get(key) for key in self.parameters + ["recordedAt"]}
+        elif warm:
+            window = {"$slice": -MAX_PROFILE_RECOMMENDATIONS}
+            update["$push"] = {
+                "recommendationMatrix": dict(window, **{"$each": build_parameter_matrix(entries, self.parameters).tolist()}),
+                "recommendationTexts": dict(window, **{"$each": [entry.get("recommendationText") for entry in entries]}),
+                "recommendationDates": dict(window, **{"$each": [entry.get("recommendationDate") for entry in entries]}),
+            }
+
+        # The count guard makes a concurrent rebuild or a replayed event fall through to a rebuild
+        result = profiles.update_one({"userId": user_oid, count_field: first_index}, update)
+        if result.matched_count == 0:
+            return False
+        self.applied += 1
+        if self.on_updated is not None:
+            self.on_updated(str(user_oid))
+        return True
+
+    def apply_change(self, change):
+        """Queue what a history change event needs: its appended entries, or a rebuild."""
+        if change is None:
+            self.schedule_all()
+            return
+        user_id = (change.get("fullDocument") or {}).get("userId")
+        if user_id is None:
+            # Deletes don't say whose history went away
+            self.schedule_all()
+            return
+        appended = appended_entries(change)
+        if appended is None:
+            self.schedule(str(user_id))
+            return
+        self._ensure_started()
+        with self._condition:
+            self._appends.append((str(user_id),) + appended)
+            self._condition.notify()
+
+    def is_leader(self):
+        """
+        Whether this process applies change events to profiles, taking or renewing the shared
+        lease when the local answer is older than a third of the lease.
+        """
+        if self._owner_pid != os.getpid():
+            # A forked worker is a different holder
+            self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            self._owner_pid = os.getpid()
+            self._leader = False
+            self._lease_checked_until = 0.0
+        if time.monotonic() < self._lease_checked_until:
+            return self._leader
+
+        now = datetime.now(timezone.utc)
+        previous = None
+        try:
+            previous = self.get_db()[STATE_COLLECTION].find_one_and_update(
+                # lease_until: None also matches a missing field
+                {"_id": STATE_ID, "$or": [{"owner": self.owner}, {"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True
+            )
+            leader = True
+        except DuplicateKeyError:
+            # Another live process holds the lease
+            leader = False
+        self._lease_checked_until = time.monotonic() + self.lease_seconds / 3
+
+        takeover = leader and previous is not None and previous.get("owner") != self.owner
+        self._leader = leader
+        if leader:
+            # The worker thread renews the lease while this process holds it
+            self._ensure_started()
+        if takeover:
+            self.takeovers += 1
+            logger.info("Took over profile sync from %s; resyncing every profile", previous.get("owner"))
+            self.schedule_all()
+        return leader
+
+    def backfill(self):
+        """Rebuild the profile of every user that has parameters."""
+        for document in self.get_db()["userparameters"].find({}, {"userId": 1, "_id": 0}):
+            if document.get("userId") is not None:
+                self.schedule(str(document["userId"]))
+
+    def schedule(self, user_id):
+        """Queue a profile rebuild; repeated requests for the same user collapse into one."""
+        self._ensure_started()
+        with self._condition:
+            self._pending.add(user_id)
+            self._condition.notify()
+
+    def schedule_all(self):
+        """Queue a rebuild of every profile (used when we can't tell which user changed)."""
+        self._ensure_started()
+        with self._condition:
+            self._backfill_pending = True
+            self._condition.notify()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="profile-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            append = None
+            with self._condition:
+                if not self._pending and not self._backfill_pending and not self._appends:
+                    self._condition.wait(timeout=self.lease_seconds / 3)
+                if self._backfill_pending:
+                    self._backfill_pending = False
+                    user_id, backfill = None, True
+                elif self._appends:
+                    # In arrival order, so a user's appends line up one after another
+                    append = self._appends.popleft()
+                    user_id, backfill = append[0], False
+                elif self._pending:
+                    user_id, backfill = self._pending.pop(), False
+                else:
+                    user_id, backfill = None, False
+            if self._leader:
+                try:
+                    self.is_leader()
+                except Exception as e:
+                    logger.error("Profile sync lease renewal failed: %s", e)
+            if user_id is None and not backfill:
+                continue
+            try:
+                if backfill:
+                    self.backfill()
+                elif append is not None:
+                    if not self.apply_append(*append):
+                        self.schedule(user_id)
+                else:
+                    self.rebuild(user_id)
+            except Exception as e:
+                self.failed += 1
+                logger.error("Profile sync failed for %s: %s", user_id or "all users", e)
+                if append is not None:
+                    self.schedule(user_id)
+
+    def stats(self):
+        with self._condition:
+            pending = len(self._pending) + len(self._appends)
+        return {"pending": pending, "rebuilt": self.rebuilt, "applied": self.applied, "failed": self.failed,
+                "leader": self._leader and self._owner_pid == os.getpid(), "takeovers": self.takeovers}
@@ -0,0 +1,72 @@
+# Purpose: Vectorized similarity scoring for content-based recommendations.
+# Features:
+# Builds a NumPy matrix of recommendation parameters (one row per past recommendation).
+# Scores every row at once as a weighted closeness to the target parameters.
+# Picks the top k with argpartition instead of sorting the whole history.
+
+import numpy as np
+
+
+def _to_float(value):
+    if value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_parameter_matrix(entries, parameters):
+    """Matrix of shape (len(entries), len(parameters)); missing values count as 0."""
+    return np.array(
+        [[_to_float(entry.get(param, 0)) for param in parameters] for entry in entries],
+        dtype=np.float64,
+    ).reshape(len(entries), len(parameters))
+
+
+def latest_entry(entries, date_key):
+    """The entry with the most recent date_key, or None if there is none."""
+    latest = None
+    for entry in entries:
+        date = entry.get(date_key)
+        if date is not None and (latest is None or date > latest.get(date_key)):
+            latest = entry
+    return latest
+
+
+def score_rows(matrix, target, weights):
+    """
+    Similarity of every row to target: sum of weight * (1 - |value - target|).
+    Rows that can't be scored (NaN) get -inf so they are never picked.
+    """
+    scores = (1.0 - np.abs(matrix - target)) @ weights
+    return np.nan_to_num(scores, nan=-np.inf)
+
+
+def _recency_key(date):
+    # Undated rows sort after dated ones
+    return (0,) if date is None else (1, date)
+
+
+def top_k_indices(scores, k, dates=None):
+    """
+    Indices of the k highest scores, best first. Equal scores are ordered most
+    recent first when dates (one per row) are given.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if k < n:
+        # Partial selection; keep every row tied with the k-th score so ties resolve by date
+        kth = np.argpartition(-scores, k - 1)[:k]
+        candidates = np.flatnonzero(scores >= scores[kth].min())
+    else:
+        candidates = np.arange(n)
+
+    candidates = candidates.tolist()
+    if dates is not None:
+        candidates.sort(key=lambda i: _recency_key(dates[i]), reverse=True)
+    # Stable sort keeps the recency order among equal scores
+    candidates.sort(key=lambda i: -scores[i])
+    return candidates[:k]
@@ -0,0 +1,131 @@
+# Purpose: Bounded in-process cache for per-user results.
+# Features:
+# LRU eviction capped by entry count and approximate bytes, plus a TTL per entry.
+# Entries are grouped by user so one user's results can be invalidated at once.
+# Per-user generations let a writer skip storing a result computed before an invalidation.
+# Hit, miss, eviction, expiry and invalidation counters.
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (value, expires_at, size_bytes, user_id)
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # user_id -> version of its last invalidation; bounded, users pushed out read as _floor
+        self._generations = OrderedDict()
+        self._version = 0
+        self._floor = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def _remove(self, key):
+        value, expires_at, size, user_id = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+    def get(self, key):
+        """Cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, user_id):
+        """Token to read before computing a result and pass to put()."""
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def _bump(self, user_id):
+        self._version += 1
+        self._generations[user_id] = self._version
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.max_entries:
+            # A forgotten user reads as the newest forgotten version, so it never matches an older token
+            _, self._floor = self._generations.popitem(last=False)
+
+    def put(self, user_id, key, value, generation=None):
+        """
+        Store a result. With the token from generation(), the write is skipped
+        when the user was invalidated while the result was being computed.
+        """
+        # JSON size is a good enough estimate for the JSON-ready results we cache
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generations.get(user_id, self._floor):
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size, user_id)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            self._bytes += size
+            # Evict least recently used entries until both caps hold
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """Drop every cached result for a user."""
+        with self._lock:
+            self._bump(user_id)
+            keys = list(self._keys_by_user.get(user_id, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._version += 1
+            self._floor = self._version
+            self._generations.clear()
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
@@ -0,0 +1,116 @@
+# Purpose: Rule engine for cold-start recommendations.
+# Features:
+# Range tables are loaded from data/cold_recommendation_rules.json and compiled
+# once into sorted boundary arrays.
+# Single readings are looked up with bisect, batches with np.searchsorted.
+# A value matches the range with low <= value < high; anything else gets the out-of-range message.
+
+import json
+import os
+from bisect import bisect_right
+import numpy as np
+
+RULES_PATH = os.environ.get("COLD_RULES_PATH", "data/cold_recommendation_rules.json")
+OUT_OF_RANGE_MESSAGE = "!!!Value {value} is out of expected range. Consider consulting a professional."
+# Index returned for a reading that has no value for a parameter
+MISSING = -2
+OUT_OF_RANGE = -1
+
+
+class RuleTable:
+    def __init__(self, parameter, ranges):
+        """ranges: list of (low, high, advice), sorted and non-overlapping."""
+        for (low, high, _), (next_low, _, _) in zip(ranges, ranges[1:] + [(float("inf"), None, None)]):
+            if not low < high or high > next_low:
+                raise ValueError(f"Ranges for {parameter} must be sorted and non-overlapping")
+        self.parameter = parameter
+        self.lows = [low for low, _, _ in ranges]
+        self.highs = [high for _, high, _ in ranges]
+        self.advice = [advice for _, _, advice in ranges]
+        self.low_array = np.array(self.lows, dtype=np.float64)
+        self.high_array = np.array(self.highs, dtype=np.float64)
+
+    def lookup(self, value):
+        """Index of the range containing value, or OUT_OF_RANGE."""
+        index = bisect_right(self.lows, value) - 1
+        if index >= 0 and value < self.highs[index]:
+            return index
+        return OUT_OF_RANGE
+
+    def lookup_many(self, values):
+        """Vectorized lookup for a float array (NaN counts as out of range)."""
+        index = np.searchsorted(self.low_array, values, side="right") - 1
+        inside = (index >= 0) & (values < self.high_array[np.clip(index, 0, None)])
+        return np.where(inside, index, OUT_OF_RANGE)
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ColdRuleEngine:
+    def __init__(self, rules):
+        """rules: {parameter: [[low, high, advice], ...]}; parameter order is the advice order."""
+        self.tables = [RuleTable(parameter, [tuple(r) for r in ranges]) for parameter, ranges in rules.items()]
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def recommend(self, input_data):
+        """Advice for one reading, one message per parameter present in it."""
+        recommendations = []
+        for table in self.tables:
+            value = input_data.get(table.parameter)
+            if value is not None:
+                index = table.lookup(value)
+                if index == OUT_OF_RANGE:
+                    recommendations.append(OUT_OF_RANGE_MESSAGE.format(value=value))
+                else:
+                    recommendations.append(table.advice[index])
+        return recommendations
+
+    def advice_indices(self, readings):
+        """
+        Map many readings to advice indices in one vectorized pass per parameter.
+
+        Returns an int array of shape (len(readings), n_parameters) holding the range
+        index, OUT_OF_RANGE, or MISSING when the reading has no value for the parameter.
+        """
+        indices = np.empty((len(readings), len(self.tables)), dtype=np.int64)
+        for column, table in enumerate(self.tables):
+            raw = [reading.get(table.parameter) for reading in readings]
+            present = np.array([value is not None for value in raw], dtype=bool)
+            values = np.array([_as_float(value) if value is not None else np.nan for value in raw], dtype=np.float64)
+            indices[:, column] = np.where(present, table.lookup_many(values), MISSING)
+        return indices
+
+    def recommend_batch(self, readings):
+        """Advice lists for many readings, the same as calling recommend() on each."""
+        indices = self.advice_indices(readings)
+        results = []
+        for reading, row in zip(readings, indices.tolist()):
+            recommendations = []
+            for table, index in zip(self.tables, row):
+                if index == MISSING:
+                    continue
+                if index == OUT_OF_RANGE:
+                    recommendations.append(OUT_OF_RANGE_MESSAGE.format(value=reading.get(table.parameter)))
+                else:
+                    recommendations.append(table.advice[index])
+            results.append(recommendations)
+        return results
+
+
+# Compiled once at import; call load_rules() to pick up an edited rules file
+cold_rules = ColdRuleEngine.from_file()
+
+
+def load_rules(path=RULES_PATH):
+    global cold_rules
+    cold_rules = ColdRuleEngine.from_file(path)
+    return cold_rules
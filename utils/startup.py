@@ -0,0 +1,58 @@
+# Purpose: Time the phases of application startup.
+# Features:
+# Each phase (imports, DB connect, model load, warmup) is timed with a context manager.
+# The report is logged once startup finishes and served by /startup so cold-start
+# regressions show up after a deploy.
+# Import this module first so the clock starts as early as possible.
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from utils.logger import logger
+
+_started = time.perf_counter()
+
+# gunicorn.conf.py turns this off: the preloading master only imports, and each worker
+# starts its long-running threads (model watcher, change listener) in post_fork
+BACKGROUND_THREADS_AT_IMPORT = os.environ.get("BACKGROUND_THREADS_AT_IMPORT", "1") != "0"
+
+
+class StartupReport:
+    def __init__(self):
+        self.phases = []
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.total_seconds = None
+        self.pid = os.getpid()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            entry = {"phase": name, "seconds": round(time.perf_counter() - started, 4)}
+            if error is not None:
+                entry["error"] = error
+            self.phases.append(entry)
+
+    def finish(self):
+        """Record the total time since this module was imported and log the report."""
+        self.total_seconds = round(time.perf_counter() - _started, 4)
+        summary = ", ".join(f"{p['phase']}={p['seconds']:.3f}s" for p in self.phases)
+        logger.info("Startup finished in %.3fs (%s)", self.total_seconds, summary)
+
+    def report(self):
+        return {
+            "pid": self.pid,
+            "started_at": self.started_at,
+            "total_seconds": self.total_seconds,
+            "phases": list(self.phases),
+        }
+
+
+startup = StartupReport()
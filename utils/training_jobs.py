@@ -0,0 +1,315 @@
+# Purpose: Run model training as background jobs.
+# Features:
+# Submitting returns a job id immediately; training runs in a separate process pool.
+# Job state lives in the data_set.training_jobs collection, so any web worker can report it.
+# Duplicate requests for a mode that is already queued or running join the existing job,
+# across every web worker (a unique index on the active mode).
+# Workers report phase timings and progress back to the web process that submitted the job,
+# which records them and heartbeats a lease; a job whose process died is marked failed.
+
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+from config.mongodbConfig import get_client
+from utils.logger import logger
+
+TRAINING_MODES = ["full", "incremental", "select"]
+# Phases each mode reports, used to compute progress
+MODE_PHASES = {
+    "full": ["load", "split", "fit", "evaluate", "save"],
+    "incremental": ["load", "fit", "save"],
+    "select": ["load", "split", "search", "measure", "save"],
+}
+ACTIVE_STATUSES = ("queued", "running")
+# Finished jobs kept for /jobs/<id>
+MAX_FINISHED_JOBS = 100
+JOBS_COLLECTION = "training_jobs"
+# A queued or running job whose submitting process stopped heartbeating for this long is failed
+JOB_LEASE_SECONDS = float(os.environ.get("TRAINING_JOB_LEASE_SECONDS", 60))
+# Fields kept internal to the job document
+_INTERNAL_FIELDS = ("_id", "active_mode", "owner", "lease_until")
+
+# Set in each worker by _init_worker
+_progress_queue = None
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+class JobReporter:
+    """Passed into the training functions; sends phase timings back to the web process."""
+
+    def __init__(self, job_id, progress_queue):
+        self.job_id = job_id
+        self.progress_queue = progress_queue
+
+    def _send(self, event):
+        if self.progress_queue is not None:
+            self.progress_queue.put((self.job_id,) + event)
+
+    @contextmanager
+    def phase(self, name):
+        self._send(("phase_started", name, time.time()))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._send(("phase_finished", name, time.perf_counter() - started))
+
+
+def run_training_job(job_id, mode):
+    """Entry point executed in the worker."""
+    # Imported here so the web process never loads sklearn just to submit a job
+    from controller import trainingcontroller
+
+    reporter = JobReporter(job_id, _progress_queue)
+    reporter._send(("started", os.getpid(), time.time()))
+    if mode == "full":
+        return trainingcontroller.fit_full_model(phase=reporter.phase)
+    if mode == "incremental":
+        return trainingcontroller.update_model_incrementally(phase=reporter.phase)
+    if mode == "select":
+        return trainingcontroller.select_model(phase=reporter.phase)
+    raise ValueError(f"Unknown training mode: {mode}")
+
+
+def _plain(value):
+    # NumPy scalars in a training result become plain numbers before they are stored
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _public(document):
+    job = {key: value for key, value in document.items() if key not in _INTERNAL_FIELDS}
+    job["id"] = document["_id"]
+    return job
+
+
+class TrainingJobManager:
+    def __init__(self, get_collection, max_workers=1, executor_kind="process", phases=None,
+                 lease_seconds=JOB_LEASE_SECONDS):
+        """
+        get_collection: callable returning the pymongo collection holding the job documents
+        max_workers: concurrent training jobs per web process (each fit already uses every core)
+        executor_kind: "process" for a spawned process pool, "thread" to train in-process
+        phases: phase names used to compute progress, overriding MODE_PHASES for every mode
+        lease_seconds: how long a job outlives its submitting process's last heartbeat
+        """
+        self.get_collection = get_collection
+        self.max_workers = max_workers
+        self.executor_kind = executor_kind
+        self.phases = phases
+        self.lease_seconds = lease_seconds
+        self.owner = None
+        # Jobs submitted by this process: job_id -> (mode, finished phase names)
+        self._owned = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+        self._pid = None
+        self._index_ready = False
+
+    def _ensure_executor(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        if self.executor_kind == "thread":
+            self._progress_queue = queue.Queue()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker, initargs=(self._progress_queue,)
+            )
+        else:
+            # spawn: the web process runs threads, which don't mix well with fork
+            context = multiprocessing.get_context("spawn")
+            self._progress_queue = context.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=context,
+                initializer=_init_worker, initargs=(self._progress_queue,)
+            )
+        self._pid = os.getpid()
+        self._owned = {}
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        threading.Thread(target=self._consume_progress, args=(self._progress_queue,),
+                         name="training-progress", daemon=True).start()
+
+    def _collection(self):
+        collection = self.get_collection()
+        if not self._index_ready:
+            # Sparse: only queued and running jobs carry active_mode, so one active job per mode
+            collection.create_index("active_mode", unique=True, sparse=True)
+            collection.create_index([("submitted_at", DESCENDING)])
+            self._index_ready = True
+        return collection
+
+    def _lease(self):
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+
+    def _expire(self, collection, query):
+        """Fail active jobs matching query whose submitting process stopped heartbeating."""
+        collection.update_many(
+            dict(query, status={"$in": list(ACTIVE_STATUSES)}, lease_until={"$lt": datetime.now(timezone.utc)}),
+            {"$set": {"status": "failed", "phase": None, "finished_at": _now(),
+                      "error": "The process running this job exited before it finished"},
+             "$unset": {"active_mode": "", "lease_until": ""}}
+        )
+
+    def submit(self, mode):
+        """Start a training job, or return the active one for the same mode. Returns (job, created)."""
+        if mode not in TRAINING_MODES:
+            raise ValueError(f"Unknown training mode: {mode}")
+        collection = self._collection()
+        with self._lock:
+            self._ensure_executor()
+            job_id = uuid.uuid4().hex
+            document = {
+                "_id": job_id,
+                "mode": mode,
+                "status": "queued",
+                "submitted_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "phase": None,
+                "progress": 0.0,
+                "phase_seconds": {},
+                "result": None,
+                "error": None,
+                "active_mode": mode,
+                "owner": self.owner,
+                "lease_until": self._lease(),
+            }
+            # The unique active_mode index makes a concurrent submit in another worker lose the insert
+            for _ in range(3):
+                try:
+                    collection.insert_one(document)
+                    break
+                except DuplicateKeyError:
+                    self._expire(collection, {"active_mode": mode})
+                    active = collection.find_one({"active_mode": mode})
+                    if active is not None:
+                        return _public(active), False
+            else:
+                raise RuntimeError(f"Could not submit a {mode} training job")
+
+            self._owned[job_id] = (mode, set())
+            try:
+                future = self._executor.submit(run_training_job, job_id, mode)
+            except Exception:
+                self._owned.pop(job_id, None)
+                collection.update_one({"_id": job_id}, {"$set": {"status": "failed", "error": "Could not start"},
+                                                        "$unset": {"active_mode": "", "lease_until": ""}})
+                raise
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        logger.info("Submitted %s training job %s", mode, job_id)
+        return _public(document), True
+
+    def get(self, job_id):
+        collection = self._collection()
+        self._expire(collection, {"_id": job_id})
+        document = collection.find_one({"_id": job_id})
+        return None if document is None else _public(document)
+
+    def _heartbeat(self, collection):
+        with self._lock:
+            owned = list(self._owned)
+        if owned:
+            collection.update_many({"_id": {"$in": owned}, "status": {"$in": list(ACTIVE_STATUSES)}},
+                                   {"$set": {"lease_until": self._lease()}})
+
+    def _consume_progress(self, progress_queue):
+        interval = self.lease_seconds / 3
+        next_heartbeat = time.monotonic() + interval
+        while True:
+            try:
+                timeout = max(0.0, next_heartbeat - time.monotonic())
+                job_id, event, *args = progress_queue.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+            except (EOFError, OSError):
+                return
+            try:
+                collection = self._collection()
+                if time.monotonic() >= next_heartbeat:
+                    self._heartbeat(collection)
+                    next_heartbeat = time.monotonic() + interval
+                if event is not None:
+                    self._record(collection, job_id, event, args)
+            except Exception as e:
+                logger.error("Failed to record training job progress: %s", e)
+
+    def _record(self, collection, job_id, event, args):
+        with self._lock:
+            owned = self._owned.get(job_id)
+        # Progress events can arrive after the result, so never move a finished job back
+        active = {"_id": job_id, "status": {"$in": list(ACTIVE_STATUSES)}}
+        if event == "started":
+            collection.update_one({"_id": job_id, "status": "queued"}, {"$set": {
+                "status": "running",
+                "started_at": datetime.fromtimestamp(args[1], timezone.utc).isoformat(),
+                "worker_pid": args[0],
+            }})
+        elif event == "phase_started":
+            collection.update_one(active, {"$set": {"phase": args[0]}})
+        elif event == "phase_finished":
+            name, seconds = args[0], round(args[1], 4)
+            update = {f"phase_seconds.{name}": seconds}
+            if owned is not None:
+                mode, finished = owned
+                finished.add(name)
+                phases = self.phases or MODE_PHASES[mode]
+                update["progress"] = round(sum(1 for phase in phases if phase in finished) / len(phases), 2)
+            if collection.update_one(active, {"$set": update}).matched_count == 0:
+                collection.update_one({"_id": job_id}, {"$set": {f"phase_seconds.{name}": seconds}})
+
+    def _finish(self, job_id, future):
+        error = future.exception()
+        with self._lock:
+            self._owned.pop(job_id, None)
+        update = {"finished_at": _now(), "phase": None}
+        result = None
+        if error is None:
+            result = json.loads(json.dumps(future.result(), default=_plain))
+            update.update(status="succeeded", progress=1.0, result=result)
+        else:
+            update.update(status="failed", error=str(error))
+        try:
+            collection = self._collection()
+            collection.update_one({"_id": job_id}, {"$set": update, "$unset": {"active_mode": "", "lease_until": ""}})
+            self._prune(collection)
+        except Exception as e:
+            logger.error("Failed to record the end of training job %s: %s", job_id, e)
+        if error is None:
+            logger.info("Training job %s finished", job_id)
+            version = (result or {}).get("version")
+            if version and self.executor_kind != "thread":
+                # The model was published by another process; reload it here right away
+                from utils.model_registry import registry
+                registry.notify_published(version)
+        else:
+            logger.error("Training job %s failed: %s", job_id, error)
+
+    def _prune(self, collection):
+        finished = {"status": {"$nin": list(ACTIVE_STATUSES)}}
+        stale = [document["_id"] for document in
+                 collection.find(finished, {"_id": 1}).sort("submitted_at", DESCENDING).skip(MAX_FINISHED_JOBS)]
+        if stale:
+            collection.delete_many({"_id": {"$in": stale}})
+
+
+job_manager = TrainingJobManager(
+    lambda: get_client().data_set[JOBS_COLLECTION],
+    max_workers=int(os.environ.get("TRAINING_MAX_JOBS", 1)),
+    executor_kind=os.environ.get("TRAINING_EXECUTOR", "process"),
+)
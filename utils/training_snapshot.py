@@ -0,0 +1,282 @@
+# Purpose: Local copy of the stress training set.
+# Features:
+# One row-major float64 feature matrix file and one int64 target file, both raw and
+# fixed-width, plus a manifest (row count, layout, per-append checksums, _id watermark).
+# A snapshot lives in its own directory; "current" is a symlink swapped in one step when
+# a rebuilt snapshot is ready, so a crash never pairs a manifest with the wrong data.
+# sync() appends the documents newer than the watermark to the end of both files in place
+# and checksums only the appended bytes. Every sync re-checks the newest appended range and
+# the whole snapshot is re-checked every TRAINING_SNAPSHOT_VERIFY_HOURS; a missing, stale
+# or corrupted snapshot is rebuilt.
+# load() returns np.memmap views of the first `rows` rows, so loading takes milliseconds
+# and the pages are shared with every other process reading the snapshot.
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from bson import ObjectId
+from utils.data_loader import FEATURE_COLUMNS, TARGET_COLUMN, TrainingData, load_training_arrays
+from utils.logger import logger
+
+SNAPSHOT_DIR = os.environ.get("TRAINING_SNAPSHOT_DIR", "data/snapshot")
+# Hours between full checksum passes; the newest appended range is checked on every sync
+VERIFY_HOURS = float(os.environ.get("TRAINING_SNAPSHOT_VERIFY_HOURS", 24))
+CURRENT_LINK = "current"
+MANIFEST_FILE = "manifest.json"
+FEATURES_FILE = "features.f8"
+TARGET_FILE = "target.i8"
+LAYOUT = {
+    "version": 2,
+    "features": FEATURE_COLUMNS,
+    "target": TARGET_COLUMN,
+    FEATURES_FILE: "<f8",
+    TARGET_FILE: "<i8",
+}
+# Values per row in each file
+WIDTHS = {FEATURES_FILE: len(FEATURE_COLUMNS), TARGET_FILE: 1}
+
+
+def _row_bytes(name):
+    return WIDTHS[name] * np.dtype(LAYOUT[name]).itemsize
+
+
+def _checksum(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class TrainingSnapshot:
+    def __init__(self, path=SNAPSHOT_DIR, verify_hours=VERIFY_HOURS):
+        self.path = path
+        self.current = os.path.join(path, CURRENT_LINK)
+        self.verify_interval = timedelta(hours=verify_hours)
+
+    def _file_path(self, name, directory=None):
+        return os.path.join(directory or self.current, name)
+
+    @contextmanager
+    def _locked(self, exclusive=True):
+        # Training jobs and the web process may sync or load at the same time
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_manifest(self):
+        try:
+            with open(self._file_path(MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _chunk_problem(self, name, start_row, chunk):
+        """Checksum one appended range of a file against the manifest."""
+        if chunk["rows"] == 0:
+            return None
+        data = np.memmap(self._file_path(name), dtype=np.uint8, mode="r",
+                         offset=start_row * _row_bytes(name), shape=(chunk["rows"] * _row_bytes(name),))
+        if _checksum(data) != chunk[name]:
+            return f"checksum mismatch in {name} at row {start_row}"
+        return None
+
+    def _checksum_problem(self, manifest, newest_only=False):
+        start_row = 0
+        chunks = manifest["chunks"]
+        if newest_only and chunks:
+            start_row = manifest["rows"] - chunks[-1]["rows"]
+            chunks = chunks[-1:]
+        for chunk in chunks:
+            for name in WIDTHS:
+                reason = self._chunk_problem(name, start_row, chunk)
+                if reason is not None:
+                    return reason
+            start_row += chunk["rows"]
+        return None
+
+    def problem(self, manifest, verify_checksums=False):
+        """Why the snapshot on disk can't be used, or None if it is fine."""
+        if manifest is None:
+            return "no snapshot"
+        if manifest.get("layout") != LAYOUT:
+            return "layout changed"
+        rows = manifest["rows"]
+        if sum(chunk["rows"] for chunk in manifest["chunks"]) != rows:
+            return "chunks do not add up to the row count"
+        for name in WIDTHS:
+            try:
+                size = os.path.getsize(self._file_path(name))
+            except OSError:
+                return f"{name} is missing"
+            # Bytes past the manifest's rows are an interrupted append and get overwritten
+            if size < rows * _row_bytes(name):
+                return f"{name} is shorter than the manifest"
+        if verify_checksums:
+            return self._checksum_problem(manifest)
+        return None
+
+    def _verification_due(self, manifest):
+        verified_at = manifest.get("verified_at")
+        if not verified_at:
+            return True
+        return datetime.now(timezone.utc) - datetime.fromisoformat(verified_at) > self.verify_interval
+
+    @staticmethod
+    def _arrays(data):
+        return {
+            FEATURES_FILE: np.ascontiguousarray(data.X, dtype=LAYOUT[FEATURES_FILE]),
+            TARGET_FILE: np.ascontiguousarray(data.y, dtype=LAYOUT[TARGET_FILE]),
+        }
+
+    def _write_manifest(self, manifest, directory=None):
+        path = self._file_path(MANIFEST_FILE, directory)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        return manifest
+
+    def _manifest(self, rows, chunks, watermark, source_rows, verified_at):
+        return {
+            "rows": rows,
+            "source_rows": source_rows,
+            "watermark": str(watermark) if watermark else None,
+            "layout": LAYOUT,
+            "chunks": chunks,
+            "verified_at": verified_at,
+            "updated_at": _now(),
+        }
+
+    def _rebuild(self, data, source_rows):
+        # The whole snapshot is written to a fresh directory, then "current" is repointed at it
+        directory_name = f"snapshot-{uuid.uuid4().hex}"
+        directory = os.path.join(self.path, directory_name)
+        os.makedirs(directory)
+        chunk = {"rows": len(data.y)}
+        for name, array in self._arrays(data).items():
+            with open(self._file_path(name, directory), "wb") as f:
+                f.write(array.data)
+                f.flush()
+                os.fsync(f.fileno())
+            chunk[name] = _checksum(array.data)
+        manifest = self._write_manifest(self._manifest(chunk["rows"], [chunk], data.last_id, source_rows, _now()),
+                                        directory)
+
+        temp_link = os.path.join(self.path, f"{CURRENT_LINK}.{uuid.uuid4().hex}.tmp")
+        os.symlink(directory_name, temp_link)
+        os.replace(temp_link, self.current)
+        self._remove_stale(keep=directory_name)
+        return manifest
+
+    def _remove_stale(self, keep):
+        # Open mappings of removed files stay valid until they are closed
+        for entry in os.listdir(self.path):
+            path = os.path.join(self.path, entry)
+            if entry in (keep, CURRENT_LINK, ".lock"):
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                # Leftover links and the files of earlier snapshot formats
+                os.remove(path)
+
+    def _append(self, manifest, data, source_rows):
+        rows = manifest["rows"]
+        chunk = {"rows": len(data.y)}
+        for name, array in self._arrays(data).items():
+            with open(self._file_path(name), "r+b") as f:
+                # Drop whatever an interrupted append left past the last recorded row
+                f.truncate(rows * _row_bytes(name))
+                f.seek(0, os.SEEK_END)
+                f.write(array.data)
+                f.flush()
+                os.fsync(f.fileno())
+            chunk[name] = _checksum(array.data)
+        # The manifest is the commit point: until it is replaced readers see the old row count
+        return self._write_manifest(self._manifest(rows + chunk["rows"], manifest["chunks"] + [chunk],
+                                                   data.last_id, source_rows, manifest.get("verified_at")))
+
+    def sync(self, collection):
+        """Bring the snapshot up to date with the collection. Returns the manifest."""
+        with self._locked():
+            manifest = self.read_manifest()
+            reason = self.problem(manifest)
+            full_check = False
+            if reason is None:
+                # The newest range on every sync, everything once the verify interval has passed
+                full_check = self._verification_due(manifest)
+                reason = self._checksum_problem(manifest, newest_only=not full_check)
+            if reason is None and manifest["watermark"]:
+                # Rows deleted or inserted below the watermark make the snapshot stale
+                source_rows = collection.count_documents({"_id": {"$lte": ObjectId(manifest["watermark"])}})
+                if source_rows != manifest["source_rows"]:
+                    reason = "collection changed below the watermark"
+
+            if reason is not None:
+                logger.info("Rebuilding training snapshot: %s", reason)
+                data = load_training_arrays(collection, sort=[("_id", 1)], with_ids=True)
+                source_rows = collection.count_documents({"_id": {"$lte": data.last_id}}) if data.last_id else 0
+                return self._rebuild(data, source_rows)
+
+            if full_check:
+                manifest = dict(manifest, verified_at=_now())
+            query = {"_id": {"$gt": ObjectId(manifest["watermark"])}} if manifest["watermark"] else {}
+            data = load_training_arrays(collection, query=query, sort=[("_id", 1)], with_ids=True)
+            if data.last_id is None:
+                logger.info("Training snapshot is up to date")
+                return self._write_manifest(manifest) if full_check else manifest
+            logger.info("Appending %s rows to the training snapshot", len(data.y))
+            source_rows = collection.count_documents({"_id": {"$lte": data.last_id}})
+            return self._append(manifest, data, source_rows)
+
+    def verify(self):
+        """Checksum every appended range; returns the problem found, or None."""
+        with self._locked(exclusive=False):
+            return self.problem(self.read_manifest(), verify_checksums=True)
+
+    def _map(self, name, rows):
+        shape = (rows, WIDTHS[name]) if name == FEATURES_FILE else (rows,)
+        if rows == 0:
+            # Empty ranges can't be memory-mapped
+            return np.empty(shape, dtype=LAYOUT[name])
+        return np.memmap(self._file_path(name), dtype=LAYOUT[name], mode="r", shape=shape)
+
+    def load(self, verify_checksums=False):
+        """Memory-map the snapshot and return it as TrainingData (X and y are read-only np.memmap views)."""
+        with self._locked(exclusive=False):
+            manifest = self.read_manifest()
+            reason = self.problem(manifest, verify_checksums=verify_checksums)
+            if reason is not None:
+                raise ValueError(f"Training snapshot is unusable: {reason}")
+            # Mappings stay valid after later appends (the mapped rows are never rewritten) or rebuilds (new directory)
+            X = self._map(FEATURES_FILE, manifest["rows"])
+            y = self._map(TARGET_FILE, manifest["rows"])
+        watermark = ObjectId(manifest["watermark"]) if manifest["watermark"] else None
+        return TrainingData(X, y, watermark)
+
+
+snapshot = TrainingSnapshot()
+
+
+def load_training_data(collection):
+    """
+    Load the training set through the local snapshot (synced first), or straight
+    from MongoDB when TRAINING_SNAPSHOT=0.
+    """
+    if os.environ.get("TRAINING_SNAPSHOT", "1") == "0":
+        return load_training_arrays(collection, with_ids=True)
+    snapshot.sync(collection)
+    return snapshot.load()
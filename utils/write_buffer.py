@@ -0,0 +1,253 @@
+# Purpose: Write-behind buffer for MongoDB inserts.
+# Features:
+# Bounded in-process queue drained by a background flusher thread.
+# Documents are grouped into insert_many batches by size or age.
+# Backpressure when the queue is full, flush on shutdown, and counters.
+# Flushes that fail on a connection error (server selection timeout, network blip)
+# are retried with exponential backoff before the documents are counted as failed.
+
+import atexit
+import os
+import queue
+import threading
+import time
+from pymongo.errors import BulkWriteError, ConnectionFailure
+from utils.logger import logger
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    def __init__(self, get_collection, max_queue_size=10000, batch_size=500,
+                 max_batch_age=0.5, put_timeout=0.05, max_retries=3, retry_backoff=0.5):
+        """
+        get_collection: callable returning the pymongo collection to insert into
+        max_queue_size: number of pending documents before backpressure kicks in
+        batch_size: maximum documents per insert_many call
+        max_batch_age: seconds a document may wait before its batch is flushed
+        put_timeout: seconds a producer blocks on a full queue before the write is dropped
+            (one deadline for a whole put_many call)
+        max_retries: retries of a flush that failed on a connection error
+        retry_backoff: seconds before the first retry; doubled on each following one
+        """
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.max_batch_age = max_batch_age
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue(maxsize=max_queue_size)
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.last_flush_seconds = 0.0
+
+    def _ensure_started(self):
+        # Start the flusher lazily, and again in a forked child where the thread does not exist
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Pending documents belong to the parent process
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._pid = os.getpid()
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+            self._thread.start()
+
+    def put(self, document):
+        """Queue a document for insertion. Returns False if it had to be dropped."""
+        self._ensure_started()
+        try:
+            # Block briefly when the queue is full so producers slow down before dropping
+            self.queue.put(document, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warn("Write-behind queue is full, dropping document")
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def put_many(self, documents):
+        """
+        Queue several documents. Returns the number that were accepted.
+
+        The whole call shares one put_timeout deadline; once it has passed on a full queue
+        the remaining documents are dropped, so a large batch never stalls the caller for long.
+        """
+        self._ensure_started()
+        deadline = time.monotonic() + self.put_timeout
+        accepted = 0
+        for document in documents:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.queue.put(document, timeout=remaining)
+                else:
+                    self.queue.put_nowait(document)
+            except queue.Full:
+                break
+            accepted += 1
+        dropped = len(documents) - accepted
+        with self._lock:
+            self.enqueued += accepted
+            self.dropped += dropped
+        if dropped:
+            logger.warn("Write-behind queue is full, dropping %s of %s documents", dropped, len(documents))
+        return accepted
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.max_batch_age)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            if first is None:
+                # Shutdown sentinel
+                self._drain()
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_batch_age
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    document = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if document is None:
+                    stop = True
+                    break
+                batch.append(document)
+
+            self._flush(batch)
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self):
+        # Flush whatever is still queued, in batch_size chunks
+        batch = []
+        while True:
+            try:
+                document = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if document is None:
+                continue
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _insert(self, batch, retried):
+        """Insert a batch; returns the number of documents now stored. Raises ConnectionFailure."""
+        try:
+            self.get_collection().insert_many(batch, ordered=False)
+            return len(batch)
+        except BulkWriteError as e:
+            # With an unordered insert the other documents were still written
+            written = e.details.get("nInserted", 0)
+            if retried:
+                # insert_many assigned the _ids on the first attempt, so duplicates were stored by it
+                written += sum(1 for error in e.details.get("writeErrors", []) if error.get("code") == DUPLICATE_KEY)
+            logger.error("Write-behind flush failed for %s documents: %s", len(batch) - written, e)
+            return written
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                written = self._insert(batch, retried=retries > 0)
+                break
+            except ConnectionFailure as e:
+                if retries >= self.max_retries:
+                    written = 0
+                    logger.error("Write-behind flush failed for %s documents after %s retries: %s",
+                                 len(batch), retries, e)
+                    break
+                delay = self.retry_backoff * (2 ** retries)
+                retries += 1
+                logger.warn("Write-behind flush hit a connection error, retrying in %.2fs: %s", delay, e)
+                time.sleep(delay)
+            except Exception as e:
+                written = 0
+                logger.error("Write-behind flush failed for %s documents: %s", len(batch), e)
+                break
+        failed = len(batch) - written
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.written += written
+            self.failed += failed
+            self.retries += retries
+            self.flushes += 1
+            self.flush_seconds_total += elapsed
+            self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+            self.last_flush_seconds = elapsed
+
+    def close(self, timeout=10):
+        """Flush pending documents and stop the flusher thread."""
+        if self._thread is None or self._pid != os.getpid() or self._closed:
+            return
+        self._closed = True
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warn("Write-behind queue is full at shutdown, waiting for the flusher to drain it")
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "queue_capacity": self.queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "retries": self.retries,
+                "flushes": self.flushes,
+                "flush_seconds_avg": self.flush_seconds_total / self.flushes if self.flushes else 0.0,
+                "flush_seconds_max": self.flush_seconds_max,
+                "last_flush_seconds": self.last_flush_seconds,
+            }
+
+
+def create_buffer(get_collection):
+    """Create a buffer configured from the environment and flushed at interpreter exit."""
+    buffer = WriteBehindBuffer(
+        get_collection,
+        max_queue_size=int(os.environ.get("WRITE_BUFFER_MAX_QUEUE", 10000)),
+        batch_size=int(os.environ.get("WRITE_BUFFER_BATCH_SIZE", 500)),
+        max_batch_age=float(os.environ.get("WRITE_BUFFER_MAX_AGE_SECONDS", 0.5)),
+        put_timeout=float(os.environ.get("WRITE_BUFFER_PUT_TIMEOUT_SECONDS", 0.05)),
+        max_retries=int(os.environ.get("WRITE_BUFFER_MAX_RETRIES", 3)),
+        retry_backoff=float(os.environ.get("WRITE_BUFFER_RETRY_BACKOFF_SECONDS", 0.5)),
+    )
+    atexit.register(buffer.close)
+    return buffer